@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Collections accessible to users.
+
+The identifiers of all collections a user may see are computed once from
+the names of restricted collections and stored in the user session.  The
+stored bit set is recomputed whenever restricted collections, their
+authorizations, the roles and their members or the collections themselves
+change, as told by the update times of their tables.  Role memberships
+expiring without a table change are noticed only once one of these tables
+changes.
+
+Hits are filtered by subtracting the records of restricted collections
+the user cannot see, except those also belonging to a restricted
+collection the user can see.  Hidden records are shared by all users with
+the same accessible collections.
+"""
+
+import threading
+from collections import OrderedDict
+
+from flask import session
+from flask_login import current_user
+from intbitset import intbitset
+from six import itervalues
+
+from invenio.base.globals import cfg
+
+from .cache import collection_hitset_cache, collection_id_cache, \
+    get_collection_hitset, restricted_collection_cache
+from .snapshot import TIMESTAMP
+
+# Session key holding signature and dumped accessible collection ids.
+SESSION_KEY = 'collections_accessible_ids'
+
+# Tables whose update times form the signature of accessible collections.
+ACCESS_TABLES = ('accROLE_accACTION_accARGUMENT', 'accARGUMENT', 'collection',
+                 'accROLE', 'user_accROLE')
+
+
+def get_access_signature():
+    """Return versions of data determining accessible collections.
+
+    The versions are update times of the tables holding the restricted
+    collections and their authorizations, the roles and their members and
+    the collections, so the signature stored in a session stays valid in
+    all processes.  The caches used to compute accessible collections are
+    refreshed after reading the versions.
+    """
+    from invenio.legacy.dbquery import get_table_update_time
+
+    signature = tuple(get_table_update_time(table)
+                      for table in ACCESS_TABLES)
+    restricted_collection_cache.recreate_cache_if_needed()
+    collection_id_cache.recreate_cache_if_needed()
+    return signature
+
+
+def _is_cacheable(signature):
+    """Return ``True`` if accessible collections may be stored.
+
+    Update times that are not timestamps never change, and caches served
+    stale during a refresh may predate the signature.
+    """
+    versions = [str(version) for version in signature]
+    return all(TIMESTAMP.match(version) for version in versions) and \
+        restricted_collection_cache.timestamp >= max(versions[:2]) and \
+        collection_id_cache.timestamp >= versions[2]
+
+
+def compute_accessible_collection_ids(user):
+    """Return bit set of collection ids accessible to a user.
+
+    :param user: user identifier or user info accepted by
+        ``acc_authorize_action``
+    """
+    from invenio_access.engine import acc_authorize_action
+    from invenio_access.local_config import VIEWRESTRCOLL
+
+    ids = collection_id_cache.cache
+    accessible = intbitset(list(itervalues(ids)))
+    for name in set(restricted_collection_cache.cache):
+        if name in ids and acc_authorize_action(
+                user, VIEWRESTRCOLL, collection=name)[0]:
+            accessible.discard(ids[name])
+    return accessible
+
+
+def get_accessible_collection_ids(user=None):
+    """Return bit set of collection ids accessible to a user.
+
+    The result for the current user is cached in the session.
+
+    :param user: user identifier or user info; defaults to current user
+    """
+    if user is not None:
+        get_access_signature()
+        return compute_accessible_collection_ids(user)
+
+    signature = get_access_signature() + (current_user.get_id(), )
+    cached = session.get(SESSION_KEY)
+    if cached is not None and tuple(cached[0]) == signature:
+        return intbitset(cached[1])
+    accessible = compute_accessible_collection_ids(current_user)
+    if _is_cacheable(signature[:-1]):
+        session[SESSION_KEY] = (signature, accessible.fastdump())
+    return accessible
+
+
+# Unions of hidden record lists keyed by accessible-set signature.
+_hidden_recids = OrderedDict()
+_hidden_recids_lock = threading.Lock()
+
+
+def get_hidden_recids(accessible):
+    """Return records of restricted collections hidden from a user.
+
+    A record is hidden when it belongs to a restricted inaccessible
+    collection and to no restricted accessible one.
+
+    :param accessible: bit set of accessible collection ids
+    """
+    restricted_collection_cache.recreate_cache_if_needed()
+    collection_id_cache.recreate_cache_if_needed()
+    collection_hitset_cache.recreate_cache_if_needed()
+    signature = (restricted_collection_cache.timestamp,
+                 collection_id_cache.timestamp,
+                 collection_hitset_cache.timestamp, accessible.fastdump())
+    with _hidden_recids_lock:
+        hidden = _hidden_recids.pop(signature, None)
+        if hidden is not None:
+            _hidden_recids[signature] = hidden
+            return hidden
+
+    ids = collection_id_cache.cache
+    hidden = intbitset()
+    visible = intbitset()
+    for name in set(restricted_collection_cache.cache):
+        if name not in ids:
+            continue
+        hitset = get_collection_hitset(name, recreate_cache_if_needed=False)
+        if ids[name] in accessible:
+            visible |= hitset
+        else:
+            hidden |= hitset
+    hidden -= visible
+
+    with _hidden_recids_lock:
+        _hidden_recids[signature] = hidden
+        while len(_hidden_recids) > \
+                cfg['COLLECTIONS_HIDDEN_RECIDS_CACHE_SIZE']:
+            _hidden_recids.popitem(last=False)
+    return hidden
+
+
+def filter_hits_for_user(hitset, user=None):
+    """Return hits without records of collections hidden from a user.
+
+    :param hitset: ``intbitset`` of record identifiers
+    :param user: user identifier or user info; defaults to current user
+    """
+    return hitset - get_hidden_recids(get_accessible_collection_ids(user))
@@ -19,38 +19,277 @@
 
 """Implementation of collections caching."""
 
+import os
+import re
+import threading
+import time
 import warnings
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
 
+from flask import current_app
 from intbitset import intbitset
+from six import iteritems, itervalues
 from werkzeug import cached_property
 
 from invenio.base.globals import cfg
 from invenio.legacy.miscutil.data_cacher import DataCacher, DataCacherProxy
 from invenio.utils.memoise import memoize
 
+from . import metrics
 
-class CollectionAllChildrenDataCacher(DataCacher):
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-    """Cache for all children of a collection."""
+
+# Names of caches to be recreated on their next check.
+_invalidated = set()
+
+
+def invalidate_cache(name):
+    """Force recreation of the named cache on its next check.
+
+    Unlike calling the cache proxy, it never instantiates (and fills) the
+    cache, so it is safe to call during a session flush.
+    """
+    _invalidated.add(name)
+
+
+@contextmanager
+def file_lock(name):
+    """Hold exclusive lock of a file in ``COLLECTIONS_CACHE_LOCK_DIR``.
+
+    Nothing is locked when the directory is not set or on platforms
+    without :mod:`fcntl`.
+    """
+    directory = cfg['COLLECTIONS_CACHE_LOCK_DIR']
+    if directory is None or fcntl is None:
+        yield
+        return
+    path = os.path.join(directory, 'collections-{0}.lock'.format(name))
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CollectionDataCacher(DataCacher):
+
+    """Data cacher recording metrics of its checks and fills.
+
+    Only one thread fills the cache at a time.  Other threads detecting an
+    outdated cache meanwhile serve the current one, or wait when there is
+    none yet.  Fills of different processes are serialized by a file lock
+    when ``COLLECTIONS_CACHE_LOCK_DIR`` is set.
+
+    With ``COLLECTIONS_CACHE_BACKGROUND_REFRESH`` enabled, an outdated
+    cache keeps being served while a background thread fills the new one.
+    The cache is refreshed synchronously once it has been outdated for
+    more than ``COLLECTIONS_CACHE_MAX_STALENESS`` seconds.
+
+    Subclasses set :attr:`name` used in metric names.
+    """
+
+    name = None
+
+    def __init__(self, cache_filler, timestamp_verifier):
+        """Initialize cache with timed cache filler."""
+        self._fill_lock = threading.Lock()
+        self._generation = 0
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._stale_since = None
+        DataCacher.__init__(
+            self,
+            metrics.timed('cache.{0}.fill'.format(self.name))(cache_filler),
+            timestamp_verifier
+        )
+
+    def create_cache(self):
+        """Fill cache and swap it in with the time the fill started."""
+        with self._fill_lock:
+            self._fill()
+
+    def _fill(self):
+        """Fill cache while holding the fill lock."""
+        with file_lock(self.name):
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+            cache = self.cache_filler()
+        self.cache, self.timestamp = cache, timestamp
+        self._generation += 1
+        self._stale_since = None
+
+    def _may_serve_stale(self):
+        """Return ``True`` if the current cache is not too stale."""
+        if getattr(self, 'cache', None) is None:
+            return False
+        return self._stale_since is None or time.time() - \
+            self._stale_since <= cfg['COLLECTIONS_CACHE_MAX_STALENESS']
+
+    def recreate_cache_if_needed(self):
+        """Recreate cache if its timestamp is older than the tables."""
+        generation = self._generation
+        if self.name in _invalidated or \
+                self.timestamp_verifier() > self.timestamp:
+            _invalidated.discard(self.name)
+            metrics.incr('cache.{0}.miss'.format(self.name))
+            if self.refresh_in_background():
+                return
+            if not self._fill_lock.acquire(False):
+                if self._may_serve_stale():
+                    metrics.incr('cache.{0}.stale'.format(self.name))
+                    return
+                self._fill_lock.acquire()
+            try:
+                # Skip the fill when another thread has just done it.
+                if self._generation == generation:
+                    self._fill()
+            finally:
+                self._fill_lock.release()
+        else:
+            metrics.incr('cache.{0}.hit'.format(self.name))
+
+    def refresh_in_background(self):
+        """Start background refresh unless the cache is too stale.
+
+        :returns: ``True`` if the current cache can still be served
+        """
+        if not cfg['COLLECTIONS_CACHE_BACKGROUND_REFRESH'] or \
+                getattr(self, 'cache', None) is None:
+            return False
+        now = time.time()
+        with self._refresh_lock:
+            if self._stale_since is None:
+                self._stale_since = now
+            elif now - self._stale_since > \
+                    cfg['COLLECTIONS_CACHE_MAX_STALENESS']:
+                return False
+            if self._refresh_thread is None:
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh,
+                    args=(current_app._get_current_object(), ),
+                    name='collections-cache-{0}'.format(self.name))
+                self._refresh_thread.daemon = True
+                self._refresh_thread.start()
+        metrics.incr('cache.{0}.stale'.format(self.name))
+        return True
+
+    def _refresh(self, app):
+        """Fill cache in an application context of a background thread."""
+        try:
+            with app.app_context():
+                self.create_cache()
+        except Exception:
+            app.logger.exception(
+                'Background refresh of %s cache failed.', self.name)
+        finally:
+            with self._refresh_lock:
+                self._refresh_thread = None
+
+
+def descendants_from_edges(ids, edges):
+    """Return descendants bit set of every collection.
+
+    Collections are visited bottom-up in topological order, so the bit set
+    of each collection is the union of the already computed bit sets of its
+    sons.  Collections in a cycle and their ancestors cannot be ordered;
+    their descendants are found by a depth-first search after a warning.
+
+    :param ids: iterable of collection identifiers
+    :param edges: iterable of ``(id_dad, id_son)`` pairs
+    :returns: dictionary mapping collection id to :class:`intbitset`
+        containing the collection itself and all its descendants
+    """
+    ids = set(ids)
+    sons = dict((id_, []) for id_ in ids)
+    dads = dict((id_, []) for id_ in ids)
+    for id_dad, id_son in edges:
+        if id_dad in ids and id_son in ids:
+            sons[id_dad].append(id_son)
+            dads[id_son].append(id_dad)
+
+    pending = dict((id_, len(sons[id_])) for id_ in ids)
+    stack = [id_ for id_ in ids if not pending[id_]]
+    descendants = {}
+    while stack:
+        id_ = stack.pop()
+        output = intbitset([id_])
+        for id_son in sons[id_]:
+            output |= descendants[id_son]
+        descendants[id_] = output
+        for id_dad in dads[id_]:
+            pending[id_dad] -= 1
+            if not pending[id_dad]:
+                stack.append(id_dad)
+
+    if len(descendants) < len(ids):
+        warnings.warn('Collection tree contains a cycle.', RuntimeWarning)
+        for id_ in ids - set(descendants):
+            output = intbitset([id_])
+            stack = [id_]
+            while stack:
+                for id_son in sons[stack.pop()]:
+                    if id_son in output:
+                        continue
+                    if id_son in descendants:
+                        output |= descendants[id_son]
+                    else:
+                        output.add(id_son)
+                        stack.append(id_son)
+            descendants[id_] = output
+    return descendants
+
+
+class CollectionAllChildrenDataCacher(CollectionDataCacher):
+
+    """Cache for all children of a collection.
+
+    The cache holds ``ids`` mapping collection id to the bit set of its
+    descendants and ``names`` mapping collection name to the list of names
+    of its descendants.  Both include the collection itself.  They are read
+    lazily from the snapshot when it is not older than the tables.
+    """
+
+    name = 'allchildren'
 
     def __init__(self):
         """Initilize cache."""
         def cache_filler():
-            from .models import Collection
-            collections = Collection.query.all()
-            collection_index = dict([(c.id, c.name) for c in collections])
-
-            return dict([
-                (c.name, map(collection_index.get, c.descendants_ids))
-                for c in collections
-            ])
+            from .models import Collection, CollectionCollection
+            from .snapshot import get_snapshot, is_current
+            snapshot = get_snapshot()
+            if snapshot is not None and \
+                    is_current(snapshot, timestamp_verifier()):
+                return dict(ids=snapshot.descendants,
+                            names=snapshot.descendant_names)
+
+            collection_index = dict(Collection.query.values(
+                Collection.id, Collection.name))
+            ids = descendants_from_edges(
+                collection_index, CollectionCollection.query.values(
+                    CollectionCollection.id_dad, CollectionCollection.id_son))
+
+            return dict(
+                ids=ids,
+                names=dict(
+                    (collection_index[id_],
+                     [collection_index[child] for child in children])
+                    for id_, children in iteritems(ids)
+                ),
+            )
 
         def timestamp_verifier():
             from invenio.legacy.dbquery import get_table_update_time
             return max(get_table_update_time('collection'),
                        get_table_update_time('collection_collection'))
 
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
 
 collection_allchildren_cache = DataCacherProxy(CollectionAllChildrenDataCacher)
 
@@ -59,9 +298,188 @@ def get_collection_allchildren(coll, recreate_cache_if_needed=True):
     """Return the list of all children of a collection."""
     if recreate_cache_if_needed:
         collection_allchildren_cache.recreate_cache_if_needed()
-    if coll not in collection_allchildren_cache.cache:
+    if coll not in collection_allchildren_cache.cache['names']:
         return []  # collection does not exist; return empty list
-    return collection_allchildren_cache.cache[coll]
+    return collection_allchildren_cache.cache['names'][coll]
+
+
+def get_collection_allchildren_ids(id_collection,
+                                   recreate_cache_if_needed=True):
+    """Return the bit set of all children ids of a collection."""
+    if recreate_cache_if_needed:
+        collection_allchildren_cache.recreate_cache_if_needed()
+    if id_collection not in collection_allchildren_cache.cache['ids']:
+        return intbitset()  # collection does not exist; return empty set
+    return collection_allchildren_cache.cache['ids'][id_collection]
+
+
+class CollectionIdDataCacher(CollectionDataCacher):
+
+    """Cache mapping collection names to their identifiers."""
+
+    name = 'ids'
+
+    def __init__(self):
+        """Initialize cache."""
+        def cache_filler():
+            from .models import Collection
+            collection_name_missing.clear()
+            return dict(Collection.query.values(Collection.name,
+                                                Collection.id))
+
+        def timestamp_verifier():
+            from invenio.legacy.dbquery import get_table_update_time
+            return get_table_update_time('collection')
+
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
+
+collection_id_cache = DataCacherProxy(CollectionIdDataCacher)
+
+
+def get_collection_ids(names, recreate_cache_if_needed=True):
+    """Return sorted identifiers of existing collections with given names."""
+    if recreate_cache_if_needed:
+        collection_id_cache.recreate_cache_if_needed()
+    ids = collection_id_cache.cache
+    return sorted(ids[name] for name in set(names) if name in ids)
+
+
+class NegativeCache(object):
+
+    """Bounded set of recently missed keys with time-based expiration.
+
+    The least recently added keys are dropped first when the cache is full.
+    When ``maxsize`` or ``ttl`` are not given, they are read from
+    ``COLLECTIONS_NEGATIVE_CACHE_SIZE`` and ``COLLECTIONS_NEGATIVE_CACHE_TTL``.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        """Initialize cache."""
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        """Return maximum number of stored keys."""
+        if self._maxsize is None:
+            return cfg['COLLECTIONS_NEGATIVE_CACHE_SIZE']
+        return self._maxsize
+
+    @property
+    def ttl(self):
+        """Return number of seconds a key is kept."""
+        if self._ttl is None:
+            return cfg['COLLECTIONS_NEGATIVE_CACHE_TTL']
+        return self._ttl
+
+    def __contains__(self, key):
+        """Return ``True`` if the key was missed recently."""
+        with self._lock:
+            expires = self._keys.get(key)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self._keys[key]
+                return False
+            return True
+
+    def __len__(self):
+        """Return number of stored keys."""
+        return len(self._keys)
+
+    def add(self, key):
+        """Remember a missed key."""
+        with self._lock:
+            self._keys.pop(key, None)
+            self._keys[key] = time.time() + self.ttl
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def discard(self, key):
+        """Forget a missed key."""
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def clear(self):
+        """Forget all missed keys."""
+        with self._lock:
+            self._keys.clear()
+
+
+# (Term, match type, word limit) triples of collection queries that matched
+# neither a collection nor any word.
+collection_hitset_missing = NegativeCache()
+
+# Names that did not match any collection, cleared by every fill of
+# ``collection_id_cache``.
+collection_name_missing = NegativeCache()
+
+
+class CollectionHitsetDataCacher(CollectionDataCacher):
+
+    """Cache for hit sets of collections including all their descendants.
+
+    The hit set of each collection is the union of the record lists of the
+    collection itself and all its descendants.  Record lists are fetched
+    only once per fill and shared between all ancestors.  The cache
+    timestamp serves as its version.  Every fill also clears
+    :data:`collection_hitset_missing`.  Record lists are read from the
+    snapshot when it is not older than the tables.
+    """
+
+    name = 'hitset'
+
+    def __init__(self):
+        """Initialize cache."""
+        def cache_filler():
+            from invenio.legacy.search_engine import get_collection_reclist
+            from .snapshot import get_snapshot, is_current
+
+            collection_allchildren_cache.recreate_cache_if_needed()
+            snapshot = get_snapshot()
+            if snapshot is not None and \
+                    not is_current(snapshot, timestamp_verifier()):
+                snapshot = None
+
+            def get_reclist(name):
+                if snapshot is not None:
+                    return snapshot.reclists.get(name, intbitset())
+                return get_collection_reclist(name)
+
+            reclists = {}
+            ret = {}
+            for name, children in iteritems(
+                    collection_allchildren_cache.cache['names']):
+                hitset = intbitset()
+                for child in children:
+                    if child not in reclists:
+                        reclists[child] = get_reclist(child)
+                    hitset |= reclists[child]
+                ret[name] = hitset
+            collection_hitset_missing.clear()
+            return ret
+
+        def timestamp_verifier():
+            from invenio.legacy.dbquery import get_table_update_time
+            return max(get_table_update_time('collection'),
+                       get_table_update_time('collection_collection'))
+
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
+
+collection_hitset_cache = DataCacherProxy(CollectionHitsetDataCacher)
+
+
+def get_collection_hitset(coll, recreate_cache_if_needed=True):
+    """Return hit set of a collection including its descendants."""
+    if recreate_cache_if_needed:
+        collection_hitset_cache.recreate_cache_if_needed()
+    if coll not in collection_hitset_cache.cache:
+        return intbitset()  # collection does not exist; return empty set
+    return collection_hitset_cache.cache[coll]
 
 
 @memoize
@@ -71,7 +489,12 @@ def get_collection_nbrecs(coll):
     return 0
 
 
-class RestrictedCollectionDataCacher(DataCacher):
+class RestrictedCollectionDataCacher(CollectionDataCacher):
+
+    """Cache for names of restricted collections."""
+
+    name = 'restricted'
+
     def __init__(self):
         def cache_filler():
             from invenio_access.control import acc_get_action_id
@@ -93,7 +516,8 @@ class RestrictedCollectionDataCacher(DataCacher):
             return max(get_table_update_time('accROLE_accACTION_accARGUMENT'),
                        get_table_update_time('accARGUMENT'))
 
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
 
 
 restricted_collection_cache = DataCacherProxy(RestrictedCollectionDataCacher)
@@ -105,11 +529,14 @@ def collection_restricted_p(collection, recreate_cache_if_needed=True):
     return collection in restricted_collection_cache.cache
 
 
-class CollectionI18nNameDataCacher(DataCacher):
+class CollectionI18nNameDataCacher(CollectionDataCacher):
     """
     Provides cache for I18N collection names.  This class is not to be
     used directly; use function get_coll_i18nname() instead.
     """
+
+    name = 'i18nname'
+
     def __init__(self):
         def cache_filler():
             from .models import Collection, Collectionname
@@ -130,7 +557,8 @@ class CollectionI18nNameDataCacher(DataCacher):
             from invenio.legacy.dbquery import get_table_update_time
             return get_table_update_time('collectionname')
 
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
 
 collection_i18nname_cache = DataCacherProxy(CollectionI18nNameDataCacher)
 
@@ -159,3 +587,187 @@ def get_coll_i18nname(c, ln=None, verify_cache_timestamp=True):
     except KeyError:
         pass  # translation in LN does not exist
     return out
+
+
+class CollectionNameIndex(object):
+
+    """Sorted array of lower-cased collection names and their translations.
+
+    Each entry maps a key (collection name or any of its I18N names) to the
+    collection name.  Prefix lookups are answered by binary search.
+    """
+
+    def __init__(self, entries):
+        """Build index from ``(key, collection name)`` pairs."""
+        entries = sorted(set((key.lower(), name) for key, name in entries))
+        self.keys = [key for key, dummy in entries]
+        self.names = [name for dummy, name in entries]
+
+    def _range(self, prefix):
+        """Return positions of keys starting with given prefix."""
+        start = bisect_left(self.keys, prefix)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(prefix):
+            end += 1
+        return start, end
+
+    @staticmethod
+    def _unique(names, limit=None, accept=None):
+        """Return accepted names without duplicates keeping the order."""
+        seen = set()
+        output = []
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                if accept is not None and not accept(name):
+                    continue
+                output.append(name)
+                if limit is not None and len(output) >= limit:
+                    break
+        return output
+
+    def prefix(self, prefix, limit=None, accept=None):
+        """Return names of collections with a key starting with prefix.
+
+        :param accept: optional predicate selecting returned names
+        """
+        start, end = self._range(prefix.lower())
+        return self._unique(self.names[start:end], limit=limit,
+                            accept=accept)
+
+    def match(self, pattern, limit=None):
+        """Return names of collections with a key matching ``*`` pattern."""
+        pattern = pattern.lower()
+        regexp = re.compile('.*'.join(
+            re.escape(part) for part in pattern.split('*')) + '$')
+        start, end = self._range(pattern.split('*', 1)[0])
+        return self._unique((
+            name for key, name in zip(self.keys[start:end],
+                                      self.names[start:end])
+            if regexp.match(key)), limit=limit)
+
+
+class CollectionNameIndexDataCacher(CollectionDataCacher):
+
+    """Cache for :class:`CollectionNameIndex` of all collections."""
+
+    name = 'nameindex'
+
+    def __init__(self):
+        """Initialize cache."""
+        def cache_filler():
+            from .models import Collection
+            collection_i18nname_cache.recreate_cache_if_needed()
+            entries = [(name, name) for (name, ) in
+                       Collection.query.values(Collection.name)]
+            for name, i18nnames in iteritems(
+                    collection_i18nname_cache.cache):
+                entries.extend((i18nname, name)
+                               for i18nname in itervalues(i18nnames))
+            return CollectionNameIndex(entries)
+
+        def timestamp_verifier():
+            from invenio.legacy.dbquery import get_table_update_time
+            return max(get_table_update_time('collection'),
+                       get_table_update_time('collectionname'))
+
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
+
+collection_name_index_cache = DataCacherProxy(CollectionNameIndexDataCacher)
+
+
+def get_collection_name_index(recreate_cache_if_needed=True):
+    """Return index of collection names and their translations."""
+    if recreate_cache_if_needed:
+        collection_name_index_cache.recreate_cache_if_needed()
+    return collection_name_index_cache.cache
+
+
+def inherit_from_dads(ids, edges, own):
+    """Return value of every collection inherited from the nearest dad.
+
+    Collections are visited top-down in topological order.  A collection
+    without its own value takes the value of the first dad (by score) that
+    has one.
+
+    :param ids: iterable of collection identifiers
+    :param edges: iterable of ``(id_dad, id_son, score)`` triples
+    :param own: dictionary mapping collection id to its own value
+    :returns: dictionary mapping collection id to its value
+    """
+    ids = set(ids)
+    dads = dict((id_, []) for id_ in ids)
+    sons = dict((id_, []) for id_ in ids)
+    for id_dad, id_son, score in sorted(edges, key=lambda edge: edge[2]):
+        if id_dad in ids and id_son in ids:
+            dads[id_son].append(id_dad)
+            sons[id_dad].append(id_son)
+
+    pending = dict((id_, len(dads[id_])) for id_ in ids)
+    stack = [id_ for id_ in ids if not pending[id_]]
+    output = {}
+    while stack:
+        id_ = stack.pop()
+        if id_ in own:
+            output[id_] = own[id_]
+        else:
+            for id_dad in dads[id_]:
+                if id_dad in output:
+                    output[id_] = output[id_dad]
+                    break
+        for id_son in sons[id_]:
+            pending[id_son] -= 1
+            if not pending[id_son]:
+                stack.append(id_son)
+    return output
+
+
+class CollectionFacetsDataCacher(CollectionDataCacher):
+
+    """Cache for facet layout of every collection.
+
+    Collections without their own configuration inherit the layout of the
+    nearest ancestor.  The cache is invalidated on every write to
+    ``facet_collection``.
+    """
+
+    name = 'facets'
+
+    def __init__(self):
+        """Initialize cache."""
+        def cache_filler():
+            from .models import Collection, CollectionCollection, \
+                FacetCollection
+            names = dict(Collection.query.values(Collection.id,
+                                                 Collection.name))
+            own = {}
+            for id_collection, facet_name in FacetCollection.query.order_by(
+                    FacetCollection.id_collection, FacetCollection.order
+            ).values(FacetCollection.id_collection,
+                     FacetCollection.facet_name):
+                own.setdefault(id_collection, []).append(facet_name)
+            layouts = inherit_from_dads(
+                names, CollectionCollection.query.values(
+                    CollectionCollection.id_dad, CollectionCollection.id_son,
+                    CollectionCollection.score), own)
+            return dict((names[id_], tuple(layout))
+                        for id_, layout in iteritems(layouts))
+
+        def timestamp_verifier():
+            from invenio.legacy.dbquery import get_table_update_time
+            return max(get_table_update_time('collection'),
+                       get_table_update_time('collection_collection'),
+                       get_table_update_time('facet_collection'))
+
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
+
+collection_facets_cache = DataCacherProxy(CollectionFacetsDataCacher)
+
+
+def get_collection_facets(coll, recreate_cache_if_needed=True):
+    """Return names of facets shown for a collection in order."""
+    if recreate_cache_if_needed:
+        collection_facets_cache.recreate_cache_if_needed()
+    return collection_facets_cache.cache.get(coll, ())
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Adds unique constraints to facet collection layout."""
+
+from invenio.ext.sqlalchemy import db
+
+from invenio_upgrader.api import op
+
+depends_on = ['collections_2015_07_14_innodb']
+
+
+def info():
+    """Return upgrade recipe information."""
+    return "Adds unique constraints to facet collection layout."
+
+
+def do_upgrade():
+    """Carry out the upgrade."""
+    op.create_unique_constraint(
+        'uq_facet_collection_order', 'facet_collection',
+        ['id_collection', 'order'])
+    op.create_unique_constraint(
+        'uq_facet_collection_facet_name', 'facet_collection',
+        ['id_collection', 'facet_name'])
+
+
+def estimate():
+    """Estimate running time of upgrade in seconds (optional)."""
+    return 1
+
+
+def pre_upgrade():
+    """Pre-upgrade checks."""
+    for columns in ('id_collection, `order`', 'id_collection, facet_name'):
+        duplicates = list(db.engine.execute(
+            """SELECT {0} FROM facet_collection GROUP BY {0} """
+            """HAVING COUNT(*) > 1""".format(columns)))
+        if duplicates:
+            raise RuntimeError(
+                "Duplicated facets ({0}) must be removed first: "
+                "{1}".format(columns, duplicates))
+
+
+def post_upgrade():
+    """Post-upgrade checks."""
+    pass
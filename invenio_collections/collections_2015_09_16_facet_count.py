@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Adds table with facet value counts of collections."""
+
+from invenio.ext.sqlalchemy import db
+
+from invenio_upgrader.api import op
+
+depends_on = ['collections_2015_09_15_facet_unique']
+
+
+def info():
+    """Return upgrade recipe information."""
+    return "Adds table with facet value counts of collections."
+
+
+def do_upgrade():
+    """Carry out the upgrade."""
+    op.create_table(
+        'collection_facet_count',
+        db.Column('id_collection', db.MediumInteger(9, unsigned=True),
+                  db.ForeignKey('collection.id'), primary_key=True),
+        db.Column('facet_name', db.String(80), primary_key=True),
+        db.Column('value', db.String(255), primary_key=True),
+        db.Column('count', db.Integer, nullable=False, server_default='0'),
+        mysql_charset='utf8',
+        mysql_engine='InnoDB',
+    )
+
+
+def estimate():
+    """Estimate running time of upgrade in seconds (optional)."""
+    return 1
+
+
+def pre_upgrade():
+    """Pre-upgrade checks."""
+    pass
+
+
+def post_upgrade():
+    """Post-upgrade checks."""
+    pass
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Adds reverse index from records to their collections."""
+
+import warnings
+
+from invenio.ext.sqlalchemy import db
+
+from invenio_upgrader.api import op
+
+depends_on = ['collections_2015_09_16_facet_count']
+
+
+def info():
+    """Return upgrade recipe information."""
+    return "Adds reverse index from records to their collections."
+
+
+def do_upgrade():
+    """Carry out the upgrade."""
+    op.create_table(
+        'collection_record',
+        db.Column('id_bibrec', db.MediumInteger(8, unsigned=True),
+                  primary_key=True, autoincrement=False),
+        db.Column('id_collections', db.LargeBinary, nullable=False),
+        mysql_charset='utf8',
+        mysql_engine='InnoDB',
+    )
+
+
+def estimate():
+    """Estimate running time of upgrade in seconds (optional)."""
+    return 1
+
+
+def pre_upgrade():
+    """Pre-upgrade checks."""
+    pass
+
+
+def post_upgrade():
+    """Post-upgrade checks."""
+    warnings.warn("Run 'inveniomanage collections reverse_index' to fill "
+                  "the reverse index of existing records.")
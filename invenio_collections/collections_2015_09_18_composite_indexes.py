@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Adds composite indexes for hot collection lookups."""
+
+from invenio_upgrader.api import op
+
+depends_on = ['collections_2015_09_17_record_collections']
+
+# Indexes as (name, table, columns); facet_collection (id_collection,
+# order) is covered by the uq_facet_collection_order constraint.
+INDEXES = [
+    ('ix_collection_collection_id_son', 'collection_collection',
+     ['id_son', 'id_dad']),
+    ('ix_collectionname_type_ln', 'collectionname', ['type', 'ln']),
+    ('ix_collection_portalbox_id_collection_ln', 'collection_portalbox',
+     ['id_collection', 'ln']),
+]
+
+
+def info():
+    """Return upgrade recipe information."""
+    return "Adds composite indexes for hot collection lookups."
+
+
+def do_upgrade():
+    """Carry out the upgrade."""
+    for name, table_name, columns in INDEXES:
+        op.create_index(name, table_name, columns)
+
+
+def estimate():
+    """Estimate running time of upgrade in seconds (optional)."""
+    return 1
+
+
+def pre_upgrade():
+    """Pre-upgrade checks."""
+    pass
+
+
+def post_upgrade():
+    """Post-upgrade checks."""
+    pass
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Invenio-Collections configuration."""
+
+COLLECTIONS_NEGATIVE_CACHE_SIZE = 1024
+"""Maximum number of unknown names remembered by negative caches."""
+
+COLLECTIONS_NEGATIVE_CACHE_TTL = 300
+"""Number of seconds after which an unknown name is looked up again."""
+
+COLLECTIONS_AUTOCOMPLETE_LIMIT = 10
+"""Maximum number of collection names returned by autocomplete."""
+
+COLLECTIONS_EXTERNAL_ENGINES = {}
+"""Search engines of hosted and external collections by name.
+
+See :mod:`invenio_collections.external` for details.
+"""
+
+COLLECTIONS_EXTERNAL_TIMEOUT = 2.0
+"""Default number of seconds to wait for an external engine."""
+
+COLLECTIONS_EXTERNAL_POOL_SIZE = 4
+"""Maximum number of idle connections kept per external host."""
+
+COLLECTIONS_EXTERNAL_PREVIEW_SIZE = 10
+"""Default number of hits returned by external engines."""
+
+COLLECTIONS_EXTERNAL_MAX_PREVIEW_SIZE = 50
+"""Maximum number of hits requested from external engines."""
+
+COLLECTIONS_EXTERNAL_CACHE_TTL = 600
+"""Number of seconds external counts and previews are cached."""
+
+COLLECTIONS_EXTERNAL_CACHE_SIZE = 1024
+"""Maximum number of cached external counts and previews."""
+
+COLLECTIONS_METRICS_SINK = 'invenio_collections.metrics:MemorySink'
+"""Import path of the metrics sink class."""
+
+COLLECTIONS_QUERY_BUDGET_ENABLED = False
+"""Count and time SQL statements of requests to collection views."""
+
+COLLECTIONS_QUERY_BUDGET = 50
+"""Number of SQL statements per request above which a warning is logged."""
+
+COLLECTIONS_WARMUP_ON_STARTUP = False
+"""Fill collection caches when the application is created.
+
+Requires ``invenio_collections.warmup`` in ``EXTENSIONS``.
+"""
+
+COLLECTIONS_SNAPSHOT_PATH = None
+"""Path of the memory-mapped collection snapshot.
+
+Regenerate it with ``inveniomanage collections snapshot``.
+"""
+
+COLLECTIONS_RECLASSIFY_BATCH_SIZE = 100
+"""Number of reclassified records between two progress reports."""
+
+COLLECTIONS_INGEST_BATCH_SIZE = 500
+"""Number of records classified or stored at once during ingestion."""
+
+COLLECTIONS_FACET_FIELDS = {}
+"""Dotted record paths of facets counted per collection by facet name.
+
+Facets not listed here are read from the record key of the same name.
+"""
+
+COLLECTIONS_LATEST_ADDITIONS_SIZE = 100
+"""Number of newest record identifiers kept per collection."""
+
+COLLECTIONS_HIDDEN_RECIDS_CACHE_SIZE = 64
+"""Number of distinct accessible collection sets with cached hidden records.
+
+Users with the same accessible collections share one union of record
+lists of restricted collections.
+"""
+
+COLLECTIONS_CACHE_BACKGROUND_REFRESH = False
+"""Serve outdated collection caches while they are refilled in background."""
+
+COLLECTIONS_CACHE_MAX_STALENESS = 60
+"""Number of seconds an outdated cache may be served before blocking."""
+
+COLLECTIONS_CACHE_LOCK_DIR = None
+"""Directory with lock files serializing cache fills across processes.
+
+When ``None``, only threads of one process are serialized.
+"""
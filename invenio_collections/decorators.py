@@ -24,6 +24,8 @@ from flask_login import current_user
 
 from invenio.base.i18n import _
 
+from . import metrics
+from .access import get_accessible_collection_ids
 from .models import Collection
 
 
@@ -44,30 +46,23 @@ def check_collection(method=None, name_getter=None, default_collection=False):
 
     @functools.wraps(method)
     def decorated(*args, **kwargs):
-        uid = current_user.get_id()
         name = name_getter()
-        if name:
-            g.collection = collection = Collection.query.filter(
-                Collection.name == name).first_or_404()
-        elif default_collection:
-            g.collection = collection = Collection.query.get_or_404(1)
-        else:
-            return abort(404)
+        with metrics.timer('check_collection.lookup'):
+            if name:
+                g.collection = collection = \
+                    Collection.get_by_name_or_404(name)
+            elif default_collection:
+                g.collection = collection = Collection.query.get_or_404(1)
+            else:
+                return abort(404)
 
         if collection.is_restricted:
-            from invenio_access.engine import acc_authorize_action
-            from invenio_access.local_config import VIEWRESTRCOLL
-            (auth_code, auth_msg) = acc_authorize_action(
-                uid,
-                VIEWRESTRCOLL,
-                collection=collection.name
-            )
-            if auth_code:
+            metrics.incr('check_collection.restricted')
+            if collection.id not in get_accessible_collection_ids():
                 flash(_('This collection is restricted.'), 'error')
-            if auth_code and current_user.is_guest:
-                return redirect(url_for('webaccount.login',
-                                        referer=request.url))
-            elif auth_code:
+                if current_user.is_guest:
+                    return redirect(url_for('webaccount.login',
+                                            referer=request.url))
                 return abort(401)
 
         return method(collection, *args, **kwargs)
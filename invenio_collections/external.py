@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Search engines for hosted and external collections.
+
+Engines are configured in ``COLLECTIONS_EXTERNAL_ENGINES`` by name:
+
+.. code-block:: python
+
+    COLLECTIONS_EXTERNAL_ENGINES = {
+        'Inspire': {
+            'engine': 'invenio_collections.external:HTTPEngine',
+            'url': 'http://inspirehep.net/search?p={query}&of=recjson'
+                   '&rg={limit}',
+            'timeout': 1.5,
+        },
+    }
+
+A hosted collection (``dbquery`` such as ``hostedcollection:Inspire``) uses
+the engine named after the ``hostedcollection:`` prefix, or after the
+collection itself when the suffix is empty.  An external collection uses
+the engine named after it.
+"""
+
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from six.moves import http_client
+from six.moves.urllib.parse import quote_plus, urlsplit
+from werkzeug.utils import import_string
+
+from invenio.base.globals import cfg
+
+logger = logging.getLogger(__name__)
+
+# Number of hits and preview of first hits returned by an engine.
+ExternalResult = namedtuple('ExternalResult', ('count', 'preview'))
+
+
+class ConnectionPool(object):
+
+    """Pool of persistent HTTP connections to one host."""
+
+    def __init__(self, scheme, netloc, maxsize):
+        """Initialize pool."""
+        self.connection_class = http_client.HTTPSConnection \
+            if scheme == 'https' else http_client.HTTPConnection
+        self.netloc = netloc
+        self.maxsize = maxsize
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self, timeout):
+        """Return an idle connection or open a new one."""
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            return self.connection_class(self.netloc, timeout=timeout)
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def put(self, connection):
+        """Return connection to the pool for reuse."""
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(url):
+    """Return connection pool shared by all engines of the same host."""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                parts.scheme, parts.netloc,
+                cfg['COLLECTIONS_EXTERNAL_POOL_SIZE'])
+        return _pools[key]
+
+
+class ExternalEngine(object):
+
+    """Base class of search engines for hosted and external collections.
+
+    Subclasses implement :meth:`search`, which is called outside of the
+    application context and must not access the configuration.
+    """
+
+    def __init__(self, name, timeout=None):
+        """Initialize engine."""
+        self.name = name
+        self.timeout = timeout or cfg['COLLECTIONS_EXTERNAL_TIMEOUT']
+
+    def search(self, query, limit):
+        """Return :class:`ExternalResult` for given query."""
+        raise NotImplementedError()
+
+
+class HTTPEngine(ExternalEngine):
+
+    """Engine querying a remote JSON search API over HTTP.
+
+    The ``url`` is formatted with the quoted ``query`` and ``limit``.  The
+    response is expected to be a JSON object with ``count`` and ``hits``
+    keys, override :meth:`parse` for other formats.
+    """
+
+    def __init__(self, name, url, timeout=None):
+        """Initialize engine."""
+        super(HTTPEngine, self).__init__(name, timeout=timeout)
+        self.url = url
+        self.pool = get_connection_pool(url)
+
+    def parse(self, body, limit):
+        """Return :class:`ExternalResult` from response body."""
+        data = json.loads(body)
+        return ExternalResult(data.get('count', 0),
+                              data.get('hits', [])[:limit])
+
+    @staticmethod
+    def _get(connection, path):
+        """Send request and return response with its body."""
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response, response.read()
+
+    def search(self, query, limit):
+        """Return :class:`ExternalResult` for given query.
+
+        A request over a reused connection the server has closed meanwhile
+        is sent once more over a new connection.
+        """
+        parts = urlsplit(self.url.format(query=quote_plus(query),
+                                         limit=limit))
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        connection = self.pool.get(self.timeout)
+        reused = connection.sock is not None
+        try:
+            try:
+                response, body = self._get(connection, path)
+            except (http_client.HTTPException, socket.error) as error:
+                if not reused or isinstance(error, socket.timeout):
+                    raise
+                connection.close()
+                response, body = self._get(connection, path)
+        except Exception:
+            connection.close()
+            raise
+        self.pool.put(connection)
+        if response.status != 200:
+            raise IOError('{0} returned HTTP {1}'.format(self.name,
+                                                         response.status))
+        return self.parse(body, limit)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name):
+    """Return configured engine instance or ``None``."""
+    with _engines_lock:
+        if name not in _engines:
+            config = cfg['COLLECTIONS_EXTERNAL_ENGINES'].get(name)
+            if config is None:
+                return None
+            config = dict(config)
+            engine_class = import_string(config.pop(
+                'engine', 'invenio_collections.external:HTTPEngine'))
+            _engines[name] = engine_class(name, **config)
+        return _engines[name]
+
+
+def get_collection_engines(collection):
+    """Return engines of hosted descendants and external collections."""
+    from .models import Collection
+
+    engines = []
+    hosted = Collection.query.filter(
+        Collection.id.in_(list(collection.descendants_ids)),
+        Collection.dbquery.like('hostedcollection:%')
+    ).all()
+    externals = [ext.externalcollection
+                 for ext in collection._externalcollections if ext.type]
+    for item in hosted + externals:
+        engine = item.engine
+        if engine is not None and engine not in engines:
+            engines.append(engine)
+    return engines
+
+
+# Results keyed by engine name, query and limit in least recently used
+# order, with their expiration times.
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def _get_cached_result(key):
+    """Return cached result if it has not expired."""
+    with _results_lock:
+        expires, result = _results.pop(key, (0, None))
+        if expires <= time.time():
+            return None
+        _results[key] = (expires, result)
+        return result
+
+
+def _set_cached_result(key, result, ttl, maxsize):
+    """Store result and drop the least recently used ones over the limit."""
+    with _results_lock:
+        _results.pop(key, None)
+        _results[key] = (time.time() + ttl, result)
+        while len(_results) > maxsize:
+            _results.popitem(last=False)
+
+
+def search_engines(engines, query, limit=None):
+    """Query engines concurrently and return results received in time.
+
+    Each engine runs in its own thread and is waited for at most its
+    timeout.  The same timeout applies to every socket operation of the
+    engine, so a search may go on in the background after the caller
+    stopped waiting for it.  Results are cached per engine, query and
+    limit, including results that arrived too late for the caller; failed
+    searches are not cached.
+
+    :param engines: iterable of :class:`ExternalEngine` instances
+    :param query: query string
+    :param limit: size of the preview
+    :returns: dictionary mapping engine name to :class:`ExternalResult`
+        or ``None`` when the engine failed or timed out
+    """
+    engines = list(engines)
+    limit = limit or cfg['COLLECTIONS_EXTERNAL_PREVIEW_SIZE']
+    ttl = cfg['COLLECTIONS_EXTERNAL_CACHE_TTL']
+    maxsize = cfg['COLLECTIONS_EXTERNAL_CACHE_SIZE']
+    results = {}
+    pending = []
+
+    def run(engine, key):
+        try:
+            results[engine.name] = result = engine.search(query, limit)
+        except Exception:
+            logger.exception('External engine %s failed.', engine.name)
+        else:
+            _set_cached_result(key, result, ttl, maxsize)
+
+    for engine in engines:
+        key = (engine.name, query, limit)
+        result = _get_cached_result(key)
+        if result is not None:
+            results[engine.name] = result
+            continue
+        thread = threading.Thread(target=run, args=(engine, key))
+        thread.daemon = True
+        thread.start()
+        pending.append((engine, thread))
+
+    started = time.time()
+    for engine, thread in pending:
+        thread.join(max(0, started + engine.timeout - time.time()))
+
+    return dict((engine.name, results.get(engine.name))
+                for engine in engines)
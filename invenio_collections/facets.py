@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Precomputed facet value counts of collections.
+
+Counts are kept in ``collection_facet_count`` for every facet of the
+collection layout (see :func:`~invenio_collections.cache.\
+get_collection_facets`).  They are updated incrementally whenever the
+collections of a record are assigned.
+
+Changing a layout changes which values are counted.  Layouts replaced in
+the administration interface are recounted in the background (see
+:func:`~invenio_collections.tasks.recount_collection_facets`), after other
+changes run ``collections facets``.
+"""
+
+from collections import defaultdict
+
+import six
+from intbitset import intbitset
+from six import iteritems
+from sqlalchemy.exc import IntegrityError
+
+from invenio.base.globals import cfg
+from invenio.ext.sqlalchemy import db
+
+from .cache import collection_facets_cache, get_collection_facets, \
+    get_collection_hitset, get_collection_ids
+from .models import Collection, CollectionFacetCount
+
+
+def get_values(record, facet_name):
+    """Return set of values of a facet in a record.
+
+    The facet name is mapped to a dotted record path by
+    ``COLLECTIONS_FACET_FIELDS`` and defaults to the facet name itself.
+    """
+    path = cfg['COLLECTIONS_FACET_FIELDS'].get(facet_name, facet_name)
+    values = [record]
+    for key in path.split('.'):
+        found = []
+        for value in values:
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+                found.extend(value if isinstance(value, (list, tuple))
+                             else [value])
+        values = found
+    return set(six.text_type(value)[:255] for value in values
+               if value not in (None, '') and
+               not isinstance(value, (dict, list, tuple)))
+
+
+def _counts(record, names=None):
+    """Return facet value occurrences of a record per collection name.
+
+    :param names: collections to count, all collections of the record by
+        default
+    """
+    output = defaultdict(int)
+    if record is None:
+        return output
+    for name in record.get('_collections', []):
+        if names is not None and name not in names:
+            continue
+        for facet_name in get_collection_facets(
+                name, recreate_cache_if_needed=False):
+            for value in get_values(record, facet_name):
+                output[(name, facet_name, value)] += 1
+    return output
+
+
+# Atomic increment of a facet value count on MySQL.
+_UPSERT_MYSQL = db.text(
+    'INSERT INTO collection_facet_count '
+    '(id_collection, facet_name, value, count) '
+    'VALUES (:id_collection, :facet_name, :value, :count) '
+    'ON DUPLICATE KEY UPDATE count = count + VALUES(count)'
+)
+
+
+def _add_count(table, id_collection, facet_name, value, count):
+    """Add ``count`` to a facet value count without racing other writers.
+
+    MySQL increments the row in a single ``INSERT ... ON DUPLICATE KEY
+    UPDATE`` statement.  Other dialects update the row and insert it inside
+    a savepoint when it is missing; if a concurrent transaction inserted the
+    same row meanwhile, the update is retried.
+    """
+    if count > 0 and db.engine.dialect.name == 'mysql':
+        db.session.execute(_UPSERT_MYSQL, dict(
+            id_collection=id_collection, facet_name=facet_name,
+            value=value, count=count))
+        return
+    condition = db.and_(table.c.id_collection == id_collection,
+                        table.c.facet_name == facet_name,
+                        table.c.value == value)
+    update = table.update().where(condition).values(
+        count=table.c.count + count)
+    if db.session.execute(update).rowcount or count <= 0:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(
+                id_collection=id_collection, facet_name=facet_name,
+                value=value, count=count))
+    except IntegrityError:
+        db.session.execute(update)
+
+
+def update_facet_counts(old, new, names=None,
+                        recreate_cache_if_needed=True):
+    """Apply difference of facet values between two record versions.
+
+    :param old: stored record or ``None`` for a new record
+    :param new: record with assigned collections
+    :param names: collections to update, all by default
+    """
+    if recreate_cache_if_needed:
+        collection_facets_cache.recreate_cache_if_needed()
+    delta = _counts(new, names)
+    for key, count in iteritems(_counts(old, names)):
+        delta[key] -= count
+    delta = dict((key, count) for key, count in iteritems(delta) if count)
+    if not delta:
+        return
+
+    ids = dict(Collection.query.filter(
+        Collection.name.in_(set(name for name, dummy, dummy in delta))
+    ).values(Collection.name, Collection.id))
+    table = CollectionFacetCount.__table__
+    for (name, facet_name, value), count in iteritems(delta):
+        if name in ids:
+            _add_count(table, ids[name], facet_name, value, count)
+    db.session.execute(table.delete().where(db.and_(
+        table.c.id_collection.in_(ids.values()), table.c.count <= 0)))
+
+
+def get_facet_counts(collection, limit=None):
+    """Return facet value counts of a collection in layout order.
+
+    :param collection: :class:`~invenio_collections.models.Collection`
+    :param limit: maximum number of values per facet
+    :returns: list of ``(facet_name, [(value, count), ...])`` pairs with
+        values sorted by decreasing count
+    """
+    facet_names = get_collection_facets(collection.name)
+    counts = dict((facet_name, []) for facet_name in facet_names)
+    for facet_name, value, count in CollectionFacetCount.query.filter(
+        CollectionFacetCount.id_collection == collection.id,
+        CollectionFacetCount.facet_name.in_(facet_names)
+    ).order_by(db.desc(CollectionFacetCount.count),
+               CollectionFacetCount.value).values(
+            CollectionFacetCount.facet_name, CollectionFacetCount.value,
+            CollectionFacetCount.count):
+        if limit is None or len(counts[facet_name]) < limit:
+            counts[facet_name].append((value, count))
+    return [(facet_name, counts[facet_name]) for facet_name in facet_names]
+
+
+def rebuild_facet_counts(names=None):
+    """Recompute facet value counts from records.
+
+    :param names: collections to recount, all collections by default
+    """
+    from invenio_records.api import get_record
+    from invenio_records.models import Record
+
+    collection_facets_cache.recreate_cache_if_needed()
+    if names is None:
+        CollectionFacetCount.query.delete()
+        recids = [recid for (recid, ) in Record.query.values(Record.id)]
+    else:
+        names = set(names)
+        CollectionFacetCount.query.filter(
+            CollectionFacetCount.id_collection.in_(get_collection_ids(names))
+        ).delete(synchronize_session=False)
+        recids = intbitset()
+        for name in names:
+            recids |= get_collection_hitset(name)
+    for recid in recids:
+        record = get_record(recid)
+        if record is not None:
+            update_facet_counts(None, record, names=names,
+                                recreate_cache_if_needed=False)
+    db.session.commit()
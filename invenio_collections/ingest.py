@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Streaming classification of records into collections.
+
+Records are read, classified and written one batch at a time, so memory
+use does not depend on the size of the input.
+"""
+
+import json
+from itertools import islice
+
+from . import metrics
+
+
+def read_marcxml(stream):
+    """Yield records converted from a MARCXML stream."""
+    from dojson.contrib.marc21 import marc21
+    from dojson.contrib.marc21.utils import load
+
+    for blob in load(stream):
+        yield marc21.do(blob)
+
+
+def read_jsonlines(stream):
+    """Yield records from a stream with one JSON document per line.
+
+    The documents must be records already converted by the dojson rules,
+    e.g. with a ``collections`` key.
+    """
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_marcjson(stream):
+    """Yield records converted from MARC 21 JSON lines.
+
+    Every line holds one MARC 21 record keyed by tag and indicators, e.g.
+    ``{"980__": {"a": "BOOK"}}``.
+    """
+    from dojson.contrib.marc21 import marc21
+
+    for blob in read_jsonlines(stream):
+        yield marc21.do(blob)
+
+
+READERS = {
+    'marcxml': read_marcxml,
+    'marcjson': read_marcjson,
+    'jsonl': read_jsonlines,
+}
+
+
+def batches(iterable, size):
+    """Yield lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def classify(records, batch_size):
+    """Yield batches of records with ``_collections`` assigned."""
+    from .recordext.functions.get_record_collections import \
+        check_queries, get_record_collections
+
+    for batch in batches(records, batch_size):
+        check_queries(force=True)
+        for record in batch:
+            record['_collections'] = get_record_collections(
+                record, recreate_cache_if_needed=False)
+        metrics.incr('ingest.records', len(batch))
+        yield batch
+
+
+def write_jsonlines(batches, stream):
+    """Write batches of records as JSON lines and return their number."""
+    count = 0
+    for batch in batches:
+        for record in batch:
+            stream.write(json.dumps(record))
+            stream.write('\n')
+        stream.flush()
+        count += len(batch)
+    return count
+
+
+def store(records, batch_size):
+    """Create records in batches and return their number.
+
+    Collections are assigned by the ``before_record_insert`` signal.
+    """
+    from invenio.ext.sqlalchemy import db
+    from invenio_records.api import Record
+
+    from .recordext.functions.get_record_collections import check_queries
+
+    count = 0
+    for batch in batches(records, batch_size):
+        check_queries(force=True)
+        for record in batch:
+            Record.create(record)
+        db.session.commit()
+        db.session.expunge_all()
+        metrics.incr('ingest.records', len(batch))
+        count += len(batch)
+    return count
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Bounded lists of the newest records of every collection.
+
+The lists are stored in the shared cache so that all processes see the
+records inserted by any of them.  New records are pushed only after their
+transaction is committed, so rolled back inserts never show up.
+
+With a Redis cache backend the lists are native Redis lists updated by
+atomic commands.  Other backends update them while holding a lock entry
+created by the atomic ``cache.add``.
+
+A missing list (e.g. after a cache flush) is not touched by inserts.  It is
+seeded by the next reader from the highest record identifiers of the
+collection hit set.
+"""
+
+import time
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from invenio.base.globals import cfg
+from invenio.ext.cache import cache
+from invenio.ext.sqlalchemy import db
+
+from .cache import get_collection_hitset
+
+# Key of record identifiers waiting for commit in ``Session.info``.
+PENDING_KEY = 'collections_latest_additions'
+
+# Seconds after which a lock of a list held by a crashed process expires.
+LOCK_TIMEOUT = 10
+
+
+def _key(name):
+    """Return cache key of a collection."""
+    return 'collections::latest::{0}'.format(name)
+
+
+def _redis():
+    """Return Redis client and key prefix of the cache backend or ``None``."""
+    backend = getattr(cache, 'cache', None)
+    client = getattr(backend, '_client', None)
+    if client is None or not hasattr(client, 'lpushx'):
+        return None, None
+    return client, getattr(backend, 'key_prefix', None) or ''
+
+
+@contextmanager
+def _locked(key):
+    """Hold lock of a cache key shared by all processes using the cache.
+
+    The lock entry expires after ``LOCK_TIMEOUT`` seconds, so a crashed
+    holder does not block others forever.
+    """
+    lock = key + '::lock'
+    while not cache.add(lock, 1, timeout=LOCK_TIMEOUT):
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        cache.delete(lock)
+
+
+def _seed(name):
+    """Return newest record identifiers from the collection hit set.
+
+    Only the tail of the hit set is sliced, the full hit set is never
+    converted to a list.
+    """
+    size = cfg['COLLECTIONS_LATEST_ADDITIONS_SIZE']
+    hitset = get_collection_hitset(name)
+    recids = list(hitset[-size:]) if hitset else []
+    recids.reverse()
+    return recids
+
+
+def _push(recid, names):
+    """Prepend a committed record to existing lists of given collections."""
+    size = cfg['COLLECTIONS_LATEST_ADDITIONS_SIZE']
+    client, prefix = _redis()
+    if client is not None:
+        pipeline = client.pipeline()
+        for name in names:
+            pipeline.lpushx(prefix + _key(name), recid)
+            pipeline.ltrim(prefix + _key(name), 0, size - 1)
+        pipeline.execute()
+        return
+    for name in names:
+        with _locked(_key(name)):
+            recids = cache.get(_key(name))
+            if recids is not None and recid not in recids:
+                cache.set(_key(name), ([recid] + recids)[:size], timeout=0)
+
+
+def add_latest_addition(recid, names):
+    """Prepend a new record to the lists of given collections on commit."""
+    session = db.session()
+    session.info.setdefault(PENDING_KEY, []).append(
+        (session.transaction, recid, list(names)))
+
+
+def _within(transaction, ancestor):
+    """Return ``True`` if a transaction is nested in the ancestor."""
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction._parent
+    return False
+
+
+@event.listens_for(Session, 'after_commit')
+def push_latest_additions(session):
+    """Push records once the outermost transaction is committed."""
+    if session.transaction is not None and session.transaction.nested:
+        return
+    for dummy, recid, names in session.info.pop(PENDING_KEY, ()):
+        _push(recid, names)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_latest_additions(session, previous_transaction):
+    """Drop records added within the rolled back (sub)transaction."""
+    pending = session.info.get(PENDING_KEY)
+    if pending:
+        pending[:] = [item for item in pending
+                      if not _within(item[0], previous_transaction)]
+
+
+def get_latest_additions(name, n):
+    """Return identifiers of the ``n`` newest records of a collection."""
+    client, prefix = _redis()
+    if client is None:
+        recids = cache.get(_key(name))
+        if recids is None:
+            recids = _seed(name)
+            cache.add(_key(name), recids, timeout=0)
+        return recids[:n]
+
+    key = prefix + _key(name)
+    recids = client.lrange(key, 0, n - 1)
+    if recids or client.exists(key):
+        return [int(recid) for recid in recids]
+    recids = _seed(name)
+    if recids:
+        # Seed a temporary list and move it in place only when no other
+        # process did so meanwhile.
+        seed_key = '{0}::seed::{1}'.format(key, uuid.uuid4().hex)
+        pipeline = client.pipeline()
+        pipeline.rpush(seed_key, *recids)
+        pipeline.renamenx(seed_key, key)
+        pipeline.delete(seed_key)
+        pipeline.execute()
+    return recids[:n]
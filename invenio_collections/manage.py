@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Perform operations with collections."""
+
+from __future__ import print_function
+
+import sys
+
+from invenio.base.globals import cfg
+from invenio.ext.script import Manager
+
+manager = Manager(usage=__doc__)
+
+
+@manager.option('-o', '--output', dest='output', default=None,
+                help='Snapshot file (default: COLLECTIONS_SNAPSHOT_PATH).')
+def snapshot(output=None):
+    """Regenerate the collection snapshot atomically."""
+    from .snapshot import create_snapshot
+
+    path = output or cfg['COLLECTIONS_SNAPSHOT_PATH']
+    if not path:
+        print('>>> Please set COLLECTIONS_SNAPSHOT_PATH or --output.',
+              file=sys.stderr)
+        sys.exit(1)
+    create_snapshot(path)
+    print('>>> Collection snapshot written to {0}.'.format(path))
+
+
+@manager.option('source', nargs='?', default='-',
+                help='MARCXML or JSON lines file (default: stdin).')
+@manager.option('-f', '--format', dest='input_format', default=None,
+                choices=('marcxml', 'marcjson', 'jsonl'),
+                help='Input format: MARCXML, MARC 21 JSON lines or JSON '
+                     'lines of converted records (default: guessed from '
+                     'file name).')
+@manager.option('-o', '--output', dest='output', default='-',
+                help='Output JSON lines file (default: stdout).')
+@manager.option('--store', dest='store', action='store_true', default=False,
+                help='Create records in the records store instead.')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=None, help='Number of records per batch.')
+def ingest(source='-', input_format=None, output='-', store=False,
+           batch_size=None):
+    """Assign collections to a stream of records."""
+    from . import ingest as ingestion
+
+    if input_format is None:
+        input_format = 'marcxml' if source.endswith('.xml') else 'jsonl'
+    batch_size = batch_size or cfg['COLLECTIONS_INGEST_BATCH_SIZE']
+
+    input_stream = sys.stdin if source == '-' else open(source, 'rb')
+    try:
+        records = ingestion.READERS[input_format](input_stream)
+        if store:
+            count = ingestion.store(records, batch_size)
+        else:
+            output_stream = sys.stdout if output == '-' \
+                else open(output, 'w')
+            try:
+                count = ingestion.write_jsonlines(
+                    ingestion.classify(records, batch_size), output_stream)
+            finally:
+                if output_stream is not sys.stdout:
+                    output_stream.close()
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+    print('>>> {0} records processed.'.format(count), file=sys.stderr)
+
+
+@manager.command
+def facets():
+    """Recompute facet value counts of all collections from records."""
+    from .facets import rebuild_facet_counts
+    rebuild_facet_counts()
+    print('>>> Facet value counts recomputed.')
+
+
+@manager.command
+def reverse_index():
+    """Recompute collection identifiers of all records."""
+    from .reverse_index import rebuild_record_collection_ids
+    rebuild_record_collection_ids()
+    print('>>> Reverse index of record collections recomputed.')
+
+
+def main():
+    """Run manager."""
+    from invenio.base.factory import create_app
+    app = create_app()
+    manager.app = app
+    manager.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Lightweight metrics of collection caches, classification and views.
+
+Metrics are sent to a sink configured by ``COLLECTIONS_METRICS_SINK``.
+A sink implements ``incr(name, value)`` and ``timing(name, seconds)``;
+the default :class:`MemorySink` aggregates them in memory and can be
+exported with :func:`format_statsd`.
+"""
+
+from __future__ import division
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import has_app_context
+from six import iteritems
+from werkzeug.utils import import_string
+
+from invenio.base.globals import cfg
+
+
+class MemorySink(object):
+
+    """Aggregate counters and timers in memory."""
+
+    def __init__(self):
+        """Initialize sink."""
+        self.counters = {}
+        self.timers = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        """Increase counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timing(self, name, seconds):
+        """Record duration in seconds."""
+        with self._lock:
+            count, total, minimum, maximum = self.timers.get(
+                name, (0, 0.0, seconds, seconds))
+            self.timers[name] = (count + 1, total + seconds,
+                                 min(minimum, seconds),
+                                 max(maximum, seconds))
+
+    def reset(self):
+        """Forget all recorded values."""
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+
+def format_statsd(sink, prefix='collections'):
+    """Return metrics of a memory sink in statsd-like text format.
+
+    Counters are reported as ``name:value|c``.  Every timer is reported
+    as its number of calls and its total, mean, minimum and maximum
+    duration in milliseconds.
+    """
+    lines = []
+    for name, value in sorted(iteritems(sink.counters)):
+        lines.append('{0}.{1}:{2}|c'.format(prefix, name, value))
+    for name, (count, total, minimum, maximum) in sorted(
+            iteritems(sink.timers)):
+        name = '{0}.{1}'.format(prefix, name)
+        lines.append('{0}.count:{1}|c'.format(name, count))
+        for key, value in (('total', total), ('mean', total / count),
+                           ('min', minimum), ('max', maximum)):
+            lines.append('{0}.{1}:{2:.3f}|ms'.format(name, key,
+                                                     value * 1000))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    """Return configured metrics sink."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                sink = cfg['COLLECTIONS_METRICS_SINK'] \
+                    if has_app_context() else None
+                _sink = import_string(sink)() if sink else MemorySink()
+    return _sink
+
+
+def incr(name, value=1):
+    """Increase counter."""
+    get_sink().incr(name, value)
+
+
+def timing(name, seconds):
+    """Record duration in seconds."""
+    get_sink().timing(name, seconds)
+
+
+@contextmanager
+def timer(name):
+    """Record duration of the block, also when it raises."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        timing(name, time.time() - start)
+
+
+def timed(name):
+    """Record duration of every call of the decorated function."""
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated(*args, **kwargs):
+            with timer(name):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
@@ -23,8 +23,9 @@
 import re
 from operator import itemgetter
 
-from flask import g, url_for
+from flask import abort, g, url_for
 from intbitset import intbitset
+from sqlalchemy import event
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.orderinglist import ordering_list
 from sqlalchemy.orm.collections import attribute_mapped_collection
@@ -38,7 +39,8 @@ from invenio.ext.sqlalchemy.utils import attribute_multi_dict_collection
 from invenio_formatter.registry import output_formats
 from invenio_search.models import Field, Fieldvalue
 
-from .cache import collection_restricted_p, get_coll_i18nname
+from .cache import collection_id_cache, collection_name_missing, \
+    collection_restricted_p, get_coll_i18nname, invalidate_cache
 
 external_collection_mapper = attribute_multi_dict_collection(
     creator=lambda k, v: CollectionExternalcollection(type=k,
@@ -74,6 +76,25 @@ class Collection(db.Model):
         db.Text().with_variant(db.Text(20), 'mysql'),
         nullable=True)
 
+    @classmethod
+    def get_by_name_or_404(cls, name):
+        """Return collection with given name or abort with 404.
+
+        Unknown names are remembered for a while, so repeated requests for
+        them do not query the database.  They are forgotten whenever the
+        ``collection`` table changes, e.g. when another process creates
+        the collection.
+        """
+        # Refilling the identifier cache clears the remembered names.
+        collection_id_cache.recreate_cache_if_needed()
+        if name in collection_name_missing:
+            return abort(404)
+        collection = cls.query.filter(cls.name == name).first()
+        if collection is None:
+            collection_name_missing.add(name)
+            return abort(404)
+        return collection
+
     @property
     def nbrecs(self):
         """Number of records in the collection."""
@@ -91,6 +112,15 @@ class Collection(db.Model):
         return self.dbquery.startswith('hostedcollection:') if self.dbquery \
             else False
 
+    @property
+    def engine(self):
+        """Return search engine of a hosted collection or ``None``."""
+        if not self.is_hosted:
+            return None
+        from .external import get_engine
+        return get_engine(self.dbquery[len('hostedcollection:'):].strip() or
+                          self.name)
+
     _names = db.relationship(lambda: Collectionname,
                              backref='collection',
                              collection_class=attribute_mapped_collection(
@@ -278,6 +308,12 @@ class Collection(db.Model):
         """Return search options."""
         return self._search_options
 
+    @property
+    def facet_names(self):
+        """Return facet names of the collection or its nearest ancestor."""
+        from .cache import get_collection_facets
+        return get_collection_facets(self.name)
+
     @cached_property
     def ancestors(self):
         """Get list of parent collection ids."""
@@ -402,6 +438,14 @@ class Collection(db.Model):
         foreign_keys=lambda: CollectionPortalbox.id_collection,
         order_by=lambda: db.asc(CollectionPortalbox.score))
 
+    def latest_additions(self, n=10):
+        """Return identifiers of the ``n`` newest records of collection.
+
+        Virtual collections include records added to their descendants.
+        """
+        from .latest import get_latest_additions
+        return get_latest_additions(self.name, n)
+
     def breadcrumbs(self, builder=None, ln=None):
         """Return breadcrumbs for collection."""
         ln = cfg.get('CFG_SITE_LANG') if ln is None else ln
@@ -451,6 +495,9 @@ class Collectionname(db.Model):
         (self.ln, self.type) = value
 
 
+Index('ix_collectionname_type_ln', Collectionname.type, Collectionname.ln)
+
+
 class Collectionboxname(db.Model):
 
     """Represent a Collectionboxname record."""
@@ -517,6 +564,10 @@ class CollectionCollection(db.Model):
                           backref='sons', order_by=db.asc(score))
 
 
+Index('ix_collection_collection_id_son', CollectionCollection.id_son,
+      CollectionCollection.id_dad)
+
+
 class Example(db.Model):
 
     """Represent a Example record."""
@@ -589,6 +640,10 @@ class CollectionPortalbox(db.Model):
                                 order_by=score)
 
 
+Index('ix_collection_portalbox_id_collection_ln',
+      CollectionPortalbox.id_collection, CollectionPortalbox.ln)
+
+
 class Externalcollection(db.Model):
 
     """Represent a Externalcollection record."""
@@ -601,8 +656,9 @@ class Externalcollection(db.Model):
 
     @property
     def engine(self):
-        """Engine."""
-        pass
+        """Return search engine of the external collection or ``None``."""
+        from .external import get_engine
+        return get_engine(self.name)
 
 
 class CollectionExternalcollection(db.Model):
@@ -709,6 +765,12 @@ class FacetCollection(db.Model):
     """Facet configuration for collection."""
 
     __tablename__ = 'facet_collection'
+    __table_args__ = (
+        db.UniqueConstraint('id_collection', 'order',
+                            name='uq_facet_collection_order'),
+        db.UniqueConstraint('id_collection', 'facet_name',
+                            name='uq_facet_collection_facet_name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     id_collection = db.Column(db.MediumInteger(9, unsigned=True),
@@ -748,6 +810,85 @@ class FacetCollection(db.Model):
             cls.id_collection == id_collection,
             cls.facet_name == facet_name).count())
 
+    @classmethod
+    def replace_layout(cls, id_collection, layout):
+        """Replace all facets of a collection with a new layout.
+
+        The layout is validated in memory, the old facets are deleted and
+        the new ones are inserted with a single statement in the current
+        transaction.  The unique constraints on ``(id_collection, order)``
+        and ``(id_collection, facet_name)`` guard against concurrent
+        writers; commit the session to apply the change.  Facet value
+        counts are not recomputed, see
+        :func:`~invenio_collections.tasks.recount_collection_facets`.
+
+        :param id_collection: collection identifier
+        :param layout: list of ``(order, facet_name)`` pairs
+        :raises ValueError: if an order or a facet name is repeated
+        """
+        layout = [(int(order), facet_name) for order, facet_name in layout]
+        orders = [order for order, dummy in layout]
+        names = [facet_name for dummy, facet_name in layout]
+        if len(set(orders)) != len(orders):
+            raise ValueError('Facet order is not unique.')
+        if len(set(names)) != len(names):
+            raise ValueError('Facet name is not unique.')
+
+        cls.query.filter(cls.id_collection == id_collection).delete(
+            synchronize_session=False)
+        if layout:
+            db.session.execute(cls.__table__.insert(), [
+                dict(id_collection=id_collection, order=order,
+                     facet_name=facet_name)
+                for order, facet_name in layout
+            ])
+        # Bulk statements bypass the mapper events.
+        invalidate_cache('facets')
+
+
+class CollectionFacetCount(db.Model):
+
+    """Number of records of a collection having a facet value."""
+
+    __tablename__ = 'collection_facet_count'
+
+    id_collection = db.Column(db.MediumInteger(9, unsigned=True),
+                              db.ForeignKey(Collection.id), primary_key=True)
+    facet_name = db.Column(db.String(80), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, server_default='0')
+
+    collection = db.relationship(Collection, backref='facet_counts')
+
+
+class CollectionRecord(db.Model):
+
+    """Packed identifiers of all collections of a record.
+
+    See :mod:`invenio_collections.reverse_index`.
+    """
+
+    __tablename__ = 'collection_record'
+
+    id_bibrec = db.Column(db.MediumInteger(8, unsigned=True),
+                          primary_key=True, autoincrement=False)
+    id_collections = db.Column(db.LargeBinary, nullable=False)
+
+
+@event.listens_for(Collection, 'after_insert')
+@event.listens_for(Collection, 'after_update')
+def forget_missing_collection_name(mapper, connection, target):
+    """Stop answering 404 for a newly created or renamed collection."""
+    collection_name_missing.discard(target.name)
+
+
+@event.listens_for(FacetCollection, 'after_insert')
+@event.listens_for(FacetCollection, 'after_update')
+@event.listens_for(FacetCollection, 'after_delete')
+def invalidate_facets_cache(mapper, connection, target):
+    """Invalidate facet layout cache on every facet configuration write."""
+    invalidate_cache('facets')
+
 
 __all__ = (
     'Collection',
@@ -763,4 +904,6 @@ __all__ = (
     'CollectionFormat',
     'CollectionFieldFieldvalue',
     'FacetCollection',
+    'CollectionFacetCount',
+    'CollectionRecord',
 )
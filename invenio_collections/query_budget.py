@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Per-request SQL statement accounting for collection views.
+
+When ``COLLECTIONS_QUERY_BUDGET_ENABLED`` is set, every request handled
+by a registered blueprint counts and times its SQL statements.  The
+totals are sent in the ``X-Collections-SQL-Queries`` and
+``X-Collections-SQL-Time`` (milliseconds) response headers.  Requests
+issuing more than ``COLLECTIONS_QUERY_BUDGET`` statements are logged.
+"""
+
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from invenio.base.globals import cfg
+
+from . import metrics
+
+
+class QueryStats(object):
+
+    """Number and duration of SQL statements of one request."""
+
+    def __init__(self):
+        """Initialize counters."""
+        self.count = 0
+        self.duration = 0.0
+
+
+def _get_stats():
+    """Return statistics of the current request if it is tracked."""
+    if has_request_context():
+        return getattr(g, 'collections_sql', None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    """Remember start of statement execution."""
+    if _get_stats() is not None:
+        conn.info.setdefault('collections_sql_start', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    """Account finished statement to the current request."""
+    stats = _get_stats()
+    starts = conn.info.get('collections_sql_start')
+    if stats is not None and starts:
+        stats.count += 1
+        stats.duration += time.time() - starts.pop()
+
+
+_listening = False
+_listening_lock = threading.Lock()
+
+
+def _listen():
+    """Install engine event listeners once."""
+    global _listening
+    with _listening_lock:
+        if not _listening:
+            event.listen(Engine, 'before_cursor_execute',
+                         _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+            _listening = True
+
+
+def start_tracking():
+    """Start tracking SQL statements of the current request."""
+    if cfg['COLLECTIONS_QUERY_BUDGET_ENABLED']:
+        _listen()
+        g.collections_sql = QueryStats()
+
+
+def finish_tracking(response):
+    """Add SQL statistics to the response and check the budget."""
+    stats = getattr(g, 'collections_sql', None)
+    if stats is None:
+        return response
+    g.collections_sql = None
+
+    response.headers['X-Collections-SQL-Queries'] = str(stats.count)
+    response.headers['X-Collections-SQL-Time'] = '{0:.1f}'.format(
+        stats.duration * 1000)
+    budget = cfg['COLLECTIONS_QUERY_BUDGET']
+    if budget is not None and stats.count > budget:
+        metrics.incr('views.sql.over_budget')
+        current_app.logger.warning(
+            '%s %s issued %d SQL statements in %.1f ms (budget %d).',
+            request.method, request.path, stats.count,
+            stats.duration * 1000, budget)
+    return response
+
+
+def register(blueprint):
+    """Track SQL statements of all requests handled by the blueprint."""
+    blueprint.before_request(start_tracking)
+    blueprint.after_request(finish_tracking)
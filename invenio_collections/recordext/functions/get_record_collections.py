@@ -19,54 +19,331 @@
 
 """Record field function."""
 
+import re
+
+import six
+from flask import g
 from invenio_records.signals import (
     before_record_insert,
     before_record_update,
 )
 from six import iteritems
+from werkzeug.local import LocalProxy
 
-from invenio.utils.datastructures import LazyDict
+from invenio.legacy.miscutil.data_cacher import DataCacherProxy
+from invenio_collections import metrics
+from invenio_collections.cache import CollectionDataCacher, \
+    invalidate_cache
 from invenio_search.api import Query
 
 COLLECTIONS_DELETED_RECORDS = '{dbquery} AND NOT collection:"DELETED"'
 
+# Record keys holding the deletion mark checked by the query above.
+DELETED_RECORD_KEYS = frozenset(['collections'])
+
+# Collection query which is an exact phrase match on tag 980.  Unquoted
+# words are searched as patterns, so they are never handled directly.
+MARC980_QUERY = re.compile(
+    r'^\s*980(?:__(?P<subfield>[ab]))?:\s*"(?P<value>[^"*]+)"\s*$')
+
+# Keys of parsed 980 values matched by a subfield of the query.
+MARC980_SUBFIELDS = {'a': ('primary', ), 'b': ('secondary', ),
+                     None: ('primary', 'secondary')}
+
+
+def marc980_keys(dbquery):
+    """Return ``(key, value)`` pairs matched by a 980 phrase query or None.
+
+    The keys are those produced by the ``collections`` MARC 21 rule.
+    """
+    match = MARC980_QUERY.match(dbquery)
+    if match is None:
+        return None
+    return [(key, match.group('value'))
+            for key in MARC980_SUBFIELDS[match.group('subfield')]]
+
+
+def marc980_verified(query, keys):
+    """Return ``True`` if query matches exactly records with 980 keys.
+
+    The keyword mapping of the current installation decides which record
+    keys a 980 query reads, so the query is checked on sample records.
+    """
+    def match(key, value):
+        return query.match({'collections': [{key: value}]})
+
+    for key, value in keys:
+        others = set([value + ' X', 'X' + value, value.swapcase()])
+        others.discard(value)
+        if not match(key, value) or any(match(key, other)
+                                        for other in others):
+            return False
+    for key in set(('primary', 'secondary')) - set(dict(keys)):
+        if match(key, keys[0][1]):
+            return False
+    return True
+
+
+def record_marc980_keys(record):
+    """Return ``(key, value)`` pairs of parsed 980 fields or None.
+
+    Returns ``None`` when the record has no parsed 980 fields or looks
+    deleted, so that the full queries decide.
+    """
+    values = record.get('collections')
+    if values is None or 'DELETED' in record.get('_collections', []):
+        return None
+    output = set()
+    for value in values if isinstance(values, (list, tuple)) else [values]:
+        if value.get('deleted'):
+            return None
+        for key in ('primary', 'secondary'):
+            items = value.get(key) or []
+            for item in items if isinstance(items, (list, tuple)) \
+                    else [items]:
+                if key == 'primary' and \
+                        six.text_type(item).strip().upper() == 'DELETED':
+                    return None
+                output.add((key, six.text_type(item)))
+    return output
 
+
+def _keyword_keys(keyword):
+    """Return top-level record keys a query keyword can match.
+
+    Returns ``None`` when the keys cannot be determined.
+    """
+    from invenio_search.models import Field, Tag
+
+    field = Field.query.filter_by(code=keyword).first()
+    if field is not None:
+        tags = [field_tag.tag for field_tag in field.tags]
+    else:
+        tags = Tag.query.filter_by(value=keyword).all()
+    keys = set()
+    for tag in tags:
+        for value in (tag.recjson_value or '').split(','):
+            if value.strip():
+                keys.add(value.strip().split('.')[0])
+    if keys:
+        return keys
+    if keyword[:3].isdigit():
+        return None  # unknown MARC tag
+    return set([keyword.split('.')[0]])
+
+
+def query_fields(query, keyword_keys=_keyword_keys):
+    """Return top-level record keys referenced by a query.
+
+    Returns ``None`` when the query can match any field, e.g. when it
+    contains a term without keyword or an unknown node, or depends on
+    other collections.
+
+    :param keyword_keys: function returning record keys of a keyword
+    """
+    from invenio_query_parser.ast import BinaryOp, KeywordOp, UnaryOp, \
+        ValueQuery
+
+    def walk(node):
+        if isinstance(node, KeywordOp):
+            return keyword_keys(node.left.value)
+        elif isinstance(node, ValueQuery):
+            return None
+        elif isinstance(node, BinaryOp):
+            left = walk(node.left)
+            right = walk(node.right)
+            return None if left is None or right is None else left | right
+        elif isinstance(node, UnaryOp):
+            return walk(node.op)
+        return None
+
+    fields = walk(query.query)
+    if fields is not None and '_collections' in fields:
+        return None
+    return fields
+
+
+@metrics.timed('queries.compile')
 def _queries():
     """Preprocess collection queries."""
     from invenio.ext.sqlalchemy import db
     from invenio_collections.models import Collection
-    return dict(
-        (collection.name, dict(
-            query=Query(COLLECTIONS_DELETED_RECORDS.format(
-                dbquery=collection.dbquery)
-            ),
+
+    keys = {}
+
+    def keyword_keys(keyword):
+        if keyword not in keys:
+            keys[keyword] = _keyword_keys(keyword)
+        return keys[keyword]
+
+    def fields(query):
+        output = query_fields(query, keyword_keys=keyword_keys)
+        # Deletion is marked in 980 whatever the keyword mapping says.
+        return None if output is None else output | DELETED_RECORD_KEYS
+
+    output = {}
+    for collection in Collection.query.filter(
+        Collection.dbquery.isnot(None),
+        db.not_(Collection.dbquery.like('hostedcollection:%'))
+    ).all():
+        query = Query(COLLECTIONS_DELETED_RECORDS.format(
+            dbquery=collection.dbquery))
+        marc980 = marc980_keys(collection.dbquery)
+        if marc980 is not None and not marc980_verified(query, marc980):
+            marc980 = None
+        output[collection.name] = dict(
+            query=query,
+            fields=fields(query),
+            marc980=marc980,
             ancestors=set(c.name for c in collection.ancestors
                           if c.dbquery is None)
-        ))
-        for collection in Collection.query.filter(
-            Collection.dbquery.isnot(None),
-            db.not_(Collection.dbquery.like('hostedcollection:%'))
-        ).all()
-    )
+        )
+    return output
+
+
+def _marc980_collections(queries):
+    """Map parsed 980 values to collections defined by plain 980 query."""
+    output = {}
+    for name, data in iteritems(queries):
+        for key in data['marc980'] or []:
+            output.setdefault(key, set()).add(name)
+    return output
+
+
+class CollectionQueriesDataCacher(CollectionDataCacher):
+
+    """Cache of preprocessed collection queries.
+
+    It is recreated in every process as soon as the collection tables
+    change, so records are always classified with the current queries.
+    """
+
+    name = 'queries'
+
+    def __init__(self):
+        """Initialize cache."""
+        def cache_filler():
+            queries = _queries()
+            return dict(queries=queries,
+                        marc980=_marc980_collections(queries))
+
+        def timestamp_verifier():
+            from invenio.legacy.dbquery import get_table_update_time
+            return max(get_table_update_time('collection'),
+                       get_table_update_time('collection_collection'))
+
+        CollectionDataCacher.__init__(self, cache_filler,
+                                      timestamp_verifier)
+
+collection_queries_cache = DataCacherProxy(CollectionQueriesDataCacher)
+
+
+def get_queries(recreate_cache_if_needed=True):
+    """Return preprocessed queries of regular collections by name."""
+    if recreate_cache_if_needed:
+        collection_queries_cache.recreate_cache_if_needed()
+    return collection_queries_cache.cache['queries']
 
-queries = LazyDict(_queries)
+queries = LocalProxy(get_queries)
 
 
-def get_record_collections(record):
+def reset_queries():
+    """Compile collection queries again on next use in this process."""
+    invalidate_cache('queries')
+
+
+def check_queries(force=False):
+    """Recreate compiled queries if outdated, once per application context.
+
+    Checking runs two table status queries, so it is done once per request.
+    Batch jobs running in one long application context force the check
+    before every batch.
+    """
+    if force or not getattr(g, 'collections_queries_checked', False):
+        collection_queries_cache.recreate_cache_if_needed()
+        g.collections_queries_checked = True
+
+
+@metrics.timed('classification.record')
+def get_record_collections(record, changed=None, previous=None,
+                           recreate_cache_if_needed=True):
     """Return list of collections to which record belongs to.
 
+    Collections defined by a plain 980 query are assigned directly from
+    the parsed 980 values of the record.  When ``changed`` is given, only
+    other queries referencing one of the changed keys are evaluated and
+    memberships from ``previous`` are kept for the rest.
+
     :record: Record instance
+    :changed: set of top-level keys that changed since ``previous``
+    :previous: list of collection names the record belonged to
+    :recreate_cache_if_needed: check compiled queries (see
+        :func:`check_queries`)
     :returns: list of collection names
     """
+    if recreate_cache_if_needed:
+        check_queries()
+    cache = collection_queries_cache.cache
+    queries, marc980_collections = cache['queries'], cache['marc980']
     output = set()
+    previous = set(previous or [])
+    marc980 = record_marc980_keys(record)
+    if marc980 is not None:
+        for key in marc980:
+            for name in marc980_collections.get(key, ()):
+                output.add(name)
+                output |= queries[name]['ancestors']
     for name, data in iteritems(queries):
-        if data['query'].match(record):
+        if marc980 is not None and data['marc980'] is not None:
+            continue
+        if changed is not None and data['fields'] is not None and \
+                not data['fields'] & changed:
+            matched = name in previous
+        else:
+            matched = data['query'].match(record)
+        if matched:
             output.add(name)
             output |= data['ancestors']
     return list(output)
 
 
+def changed_keys(old, new):
+    """Return top-level keys with different values, except collections."""
+    return set(key for key in set(old) | set(new)
+               if key != '_collections' and old.get(key) != new.get(key))
+
+
 @before_record_insert.connect
-@before_record_update.connect
 def update_collections(sender, *args, **kwargs):
+    from invenio_collections.facets import update_facet_counts
+    from invenio_collections.latest import add_latest_addition
+    from invenio_collections.reverse_index import \
+        update_record_collection_ids
     sender['_collections'] = get_record_collections(sender)
+    update_facet_counts(None, sender)
+    update_record_collection_ids(sender)
+    if 'recid' in sender:
+        add_latest_addition(sender['recid'], sender['_collections'])
+
+
+@before_record_update.connect
+def update_changed_collections(sender, *args, **kwargs):
+    """Evaluate only collection queries affected by the record update.
+
+    Memberships of other queries are taken from the stored record, the
+    ``_collections`` sent with the update are never trusted.
+    """
+    from invenio_collections.facets import update_facet_counts
+    from invenio_collections.reverse_index import \
+        update_record_collection_ids
+    from invenio_records.api import get_record
+
+    old = get_record(sender['recid']) if 'recid' in sender else None
+    if old is None or '_collections' not in old:
+        sender['_collections'] = get_record_collections(sender)
+    else:
+        sender['_collections'] = get_record_collections(
+            sender, changed=changed_keys(old, sender),
+            previous=old['_collections'])
+    update_facet_counts(old, sender)
+    update_record_collection_ids(sender)
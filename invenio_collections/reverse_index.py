@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Reverse index from record identifiers to collection identifiers.
+
+Collection identifiers of every record are stored in ``collection_record``
+packed as little-endian unsigned 32-bit integers.  The index is updated
+whenever the collections of a record are assigned, so that hit lists can
+be annotated with a single query instead of reading the ``_collections``
+names of each record.
+"""
+
+import struct
+
+from invenio.ext.sqlalchemy import db
+
+from .cache import get_collection_ids
+from .models import CollectionRecord
+
+# Maximum number of record identifiers in one ``IN`` clause.
+CHUNK_SIZE = 1000
+
+
+def pack(ids):
+    """Return bytes with packed collection identifiers."""
+    return struct.pack('<{0}I'.format(len(ids)), *ids)
+
+
+def unpack(data):
+    """Return tuple of collection identifiers from packed bytes."""
+    return struct.unpack('<{0}I'.format(len(data) // 4), data)
+
+
+def update_record_collection_ids(record):
+    """Store identifiers of collections assigned to a record."""
+    if 'recid' not in record:
+        return
+    db.session.merge(CollectionRecord(
+        id_bibrec=record['recid'],
+        id_collections=pack(get_collection_ids(
+            record.get('_collections', [])))))
+
+
+def get_record_collection_ids(recids):
+    """Return collection identifiers of many records.
+
+    :param recids: iterable of record identifiers (e.g. ``intbitset``)
+    :returns: dictionary mapping record identifier to sorted tuple of
+        collection identifiers; unknown records are omitted
+    """
+    recids = list(recids)
+    output = {}
+    for start in range(0, len(recids), CHUNK_SIZE):
+        output.update(
+            (recid, unpack(data)) for recid, data in
+            CollectionRecord.query.filter(CollectionRecord.id_bibrec.in_(
+                recids[start:start + CHUNK_SIZE])).values(
+                CollectionRecord.id_bibrec, CollectionRecord.id_collections))
+    return output
+
+
+def rebuild_record_collection_ids():
+    """Recompute the reverse index from all records."""
+    from invenio_records.api import get_record
+    from invenio_records.models import Record
+
+    CollectionRecord.query.delete()
+    for (recid, ) in Record.query.values(Record.id):
+        record = get_record(recid)
+        if record is not None:
+            update_record_collection_ids(record)
+    db.session.commit()
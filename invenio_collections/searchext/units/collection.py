@@ -31,14 +31,31 @@ def search_unit(query, f, m, wl=None):
 
         collection:"BOOK"
         collection:"Books"
+        collection:Book*
     """
-    from invenio.legacy.search_engine import (
-        get_collection_reclist, search_unit_in_bibwords
+    from invenio.legacy.search_engine import search_unit_in_bibwords
+    from invenio_collections.cache import (
+        collection_hitset_cache, collection_hitset_missing,
+        get_collection_hitset, get_collection_name_index
     )
-    if len(query):
-        ahitset = get_collection_reclist(query)
+    if len(query) and '*' in query:
+        collection_hitset_cache.recreate_cache_if_needed()
+        ahitset = intbitset([])
+        for name in get_collection_name_index().match(query):
+            ahitset |= get_collection_hitset(
+                name, recreate_cache_if_needed=False)
         if not ahitset:
             return search_unit_in_bibwords(query, 'collection', m, wl=wl)
         return ahitset
+    elif len(query):
+        ahitset = get_collection_hitset(query)
+        if not ahitset:
+            key = (query, m, wl)
+            if key in collection_hitset_missing:
+                return intbitset([])
+            ahitset = search_unit_in_bibwords(query, 'collection', m, wl=wl)
+            if not ahitset and query not in collection_hitset_cache.cache:
+                collection_hitset_missing.add(key)
+        return ahitset
     else:
         return intbitset([])
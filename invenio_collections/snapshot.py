@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Memory-mapped on-disk snapshot of the collection tree and reclists.
+
+A snapshot is a single binary file (little-endian) laid out as:
+
+* header: magic, format version, table update time the snapshot is
+  based on, number of collections and edges, offsets of the sections;
+* table of contents: one entry per collection sorted by id, holding the
+  offsets and lengths of its name, descendants and reclist;
+* edge list: ``(id_dad, id_son)`` pairs;
+* data: UTF-8 names and :meth:`intbitset.fastdump` bit sets.
+
+Processes map the file read-only and decode entries only when they are
+accessed, so all workers share one physical copy of it.  Snapshots are
+written to a temporary file and renamed over the old one.
+"""
+
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+
+from intbitset import intbitset
+from six.moves import range
+from werkzeug.utils import cached_property
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+MAGIC = b'INVCOLL\x00'
+
+VERSION = 1
+
+HEADER = struct.Struct('<8sI19sxIIQQ')
+
+ENTRY = struct.Struct('<IQIQIQI')
+
+EDGE = struct.Struct('<II')
+
+# Table update times comparable as strings.
+TIMESTAMP = re.compile(r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$')
+
+
+def is_current(snapshot, timestamp):
+    """Return ``True`` if the snapshot is not older than the tables.
+
+    Update times that are not timestamps (e.g. ``None`` reported by InnoDB)
+    make the snapshot stale.
+
+    :param timestamp: current table update time
+    """
+    timestamp = str(timestamp)
+    return bool(TIMESTAMP.match(snapshot.timestamp) and
+                TIMESTAMP.match(timestamp) and
+                snapshot.timestamp >= timestamp)
+
+
+def write_snapshot(path, timestamp, names, edges, descendants, reclists):
+    """Write snapshot file atomically.
+
+    :param path: destination file
+    :param timestamp: table update time in ``%Y-%m-%d %H:%M:%S`` format
+    :param names: dictionary mapping collection id to name
+    :param edges: list of ``(id_dad, id_son)`` pairs
+    :param descendants: dictionary mapping collection id to bit set of
+        its descendants
+    :param reclists: dictionary mapping collection id to its reclist
+    """
+    ids = sorted(names)
+    edges = list(edges)
+    offset = HEADER.size + len(ids) * ENTRY.size + len(edges) * EDGE.size
+    entries = []
+    blobs = []
+    for id_ in ids:
+        name = names[id_].encode('utf-8')
+        children = descendants.get(id_, intbitset([id_])).fastdump()
+        reclist = reclists.get(id_, intbitset()).fastdump()
+        entries.append(ENTRY.pack(
+            id_,
+            offset, len(name),
+            offset + len(name), len(children),
+            offset + len(name) + len(children), len(reclist)))
+        blobs.extend((name, children, reclist))
+        offset += len(name) + len(children) + len(reclist)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(HEADER.pack(
+                MAGIC, VERSION, timestamp.encode('ascii'), len(ids),
+                len(edges), HEADER.size,
+                HEADER.size + len(ids) * ENTRY.size))
+            for entry in entries:
+                fp.write(entry)
+            for edge in edges:
+                fp.write(EDGE.pack(*edge))
+            for blob in blobs:
+                fp.write(blob)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.rename(temporary, path)
+    except Exception:
+        os.unlink(temporary)
+        raise
+
+
+class _SnapshotMapping(Mapping):
+
+    """Read-only mapping decoding snapshot entries on access."""
+
+    def __init__(self, index, getter):
+        """Initialize mapping from key to entry position."""
+        self._index = index
+        self._getter = getter
+
+    def __getitem__(self, key):
+        """Decode value of given key."""
+        return self._getter(self._index[key])
+
+    def __contains__(self, key):
+        """Check key without decoding its value."""
+        return key in self._index
+
+    def __iter__(self):
+        """Iterate over keys."""
+        return iter(self._index)
+
+    def __len__(self):
+        """Return number of keys."""
+        return len(self._index)
+
+
+class Snapshot(object):
+
+    """Memory-mapped collection snapshot."""
+
+    def __init__(self, path):
+        """Map snapshot file and read its header."""
+        with open(path, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, timestamp, self.size, self.nb_edges,
+         self._entries_offset, self._edges_offset) = HEADER.unpack_from(
+            self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{0} is not a collection snapshot.'.format(path))
+        self.timestamp = timestamp.decode('ascii').rstrip('\x00')
+
+    def _entry(self, position):
+        """Return table of contents entry at given position."""
+        return ENTRY.unpack_from(
+            self._mmap, self._entries_offset + position * ENTRY.size)
+
+    def _bitset(self, offset, length):
+        """Decode bit set stored at given offset."""
+        return intbitset(self._mmap[offset:offset + length])
+
+    @cached_property
+    def _positions_by_id(self):
+        """Map collection id to entry position."""
+        return dict((self._entry(position)[0], position)
+                    for position in range(self.size))
+
+    @cached_property
+    def _positions_by_name(self):
+        """Map collection name to entry position."""
+        return dict((self.name_at(position), position)
+                    for position in range(self.size))
+
+    def name_at(self, position):
+        """Return collection name of entry at given position."""
+        dummy, offset, length = self._entry(position)[:3]
+        return self._mmap[offset:offset + length].decode('utf-8')
+
+    def descendants_at(self, position):
+        """Return descendants bit set of entry at given position."""
+        return self._bitset(*self._entry(position)[3:5])
+
+    def reclist_at(self, position):
+        """Return reclist of entry at given position."""
+        return self._bitset(*self._entry(position)[5:7])
+
+    def descendant_names_at(self, position):
+        """Return names of descendants of entry at given position."""
+        positions = self._positions_by_id
+        return [self.name_at(positions[id_])
+                for id_ in self.descendants_at(position)
+                if id_ in positions]
+
+    @cached_property
+    def descendants(self):
+        """Mapping from collection id to bit set of its descendants."""
+        return _SnapshotMapping(self._positions_by_id, self.descendants_at)
+
+    @cached_property
+    def descendant_names(self):
+        """Mapping from collection name to names of its descendants."""
+        return _SnapshotMapping(self._positions_by_name,
+                                self.descendant_names_at)
+
+    @cached_property
+    def reclists(self):
+        """Mapping from collection name to its reclist."""
+        return _SnapshotMapping(self._positions_by_name, self.reclist_at)
+
+    def edges(self):
+        """Iterate over ``(id_dad, id_son)`` pairs."""
+        for index in range(self.nb_edges):
+            yield EDGE.unpack_from(self._mmap,
+                                   self._edges_offset + index * EDGE.size)
+
+    def close(self):
+        """Unmap the snapshot file."""
+        self._mmap.close()
+
+
+_snapshot = None
+_snapshot_key = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """Return snapshot from ``COLLECTIONS_SNAPSHOT_PATH`` or ``None``.
+
+    The file is mapped once per process and mapped again when it has been
+    replaced.
+    """
+    from invenio.base.globals import cfg
+
+    global _snapshot, _snapshot_key
+    path = cfg['COLLECTIONS_SNAPSHOT_PATH']
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_ino, stat.st_mtime)
+    with _snapshot_lock:
+        if key != _snapshot_key:
+            _snapshot = Snapshot(path)
+            _snapshot_key = key
+        return _snapshot
+
+
+def create_snapshot(path):
+    """Write snapshot of current collection tree and reclists.
+
+    A snapshot written while the tables report no update time is never
+    used (see :func:`is_current`).
+    """
+    from invenio.legacy.dbquery import get_table_update_time
+    from invenio.legacy.search_engine import get_collection_reclist
+
+    from .cache import descendants_from_edges
+    from .models import Collection, CollectionCollection
+
+    timestamp = max(get_table_update_time('collection'),
+                    get_table_update_time('collection_collection'))
+    names = dict(Collection.query.values(Collection.id, Collection.name))
+    edges = [(id_dad, id_son) for id_dad, id_son in
+             CollectionCollection.query.values(
+                 CollectionCollection.id_dad, CollectionCollection.id_son)
+             if id_dad in names and id_son in names]
+    reclists = dict((id_, get_collection_reclist(name))
+                    for id_, name in names.items())
+    write_snapshot(path, str(timestamp), names, edges,
+                   descendants_from_edges(names, edges), reclists)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Collection background tasks."""
+
+from intbitset import intbitset
+
+from invenio.base.globals import cfg
+from invenio.celery import celery
+
+
+def _search(dbquery):
+    """Return records matching a collection query."""
+    from invenio.legacy.search_engine import search_pattern
+    from .recordext.functions.get_record_collections import \
+        COLLECTIONS_DELETED_RECORDS
+
+    if not dbquery or dbquery.startswith('hostedcollection:'):
+        return intbitset()
+    return search_pattern(p=COLLECTIONS_DELETED_RECORDS.format(
+        dbquery=dbquery))
+
+
+def _set_reclist(name, reclist):
+    """Store reclist of a collection."""
+    from invenio.legacy.dbquery import run_sql
+    run_sql('UPDATE collection SET nbrecs=%s, reclist=%s WHERE name=%s',
+            (len(reclist), reclist.fastdump(), name))
+
+
+def _store_collections(record, names):
+    """Store collections of a record computed by reclassification.
+
+    The record is written without the record update signals, which would
+    evaluate its memberships again from the stored ones.
+    """
+    from invenio.ext.sqlalchemy import db
+
+    from .facets import update_facet_counts
+    from .reverse_index import update_record_collection_ids
+
+    new = dict(record, _collections=sorted(names))
+    update_facet_counts(record, new)
+    update_record_collection_ids(new)
+    record.model.json = new
+    db.session.merge(record.model)
+
+
+@celery.task(bind=True)
+def reclassify_collection(self, id_collection, old_dbquery, new_dbquery):
+    """Reclassify records affected by a change of collection query.
+
+    Only records in the symmetric difference of the old and new hit sets
+    are updated.  Virtual ancestors are added together with the
+    collection, and removed only if no other collection of the record
+    still justifies them.  Progress is reported in the task state.
+    """
+    from invenio.legacy.search_engine import get_collection_reclist
+    from invenio_records.api import get_record
+
+    from .cache import get_collection_allchildren
+    from .models import Collection
+    from .recordext.functions import get_record_collections
+
+    collection = Collection.query.get(id_collection)
+    name = collection.name
+    ancestors = set(c.name for c in collection.ancestors
+                    if c.dbquery is None)
+    queries = get_record_collections.get_queries()
+
+    old = _search(old_dbquery)
+    new = _search(new_dbquery)
+    added = new - old
+    removed = old - new
+    affected = added | removed
+    total = len(affected)
+    batch_size = cfg['COLLECTIONS_RECLASSIFY_BATCH_SIZE']
+
+    for position, recid in enumerate(affected):
+        record = get_record(recid)
+        if record is None:
+            continue
+        names = set(record.get('_collections', []))
+        if recid in added:
+            names.add(name)
+            names |= ancestors
+        else:
+            names.discard(name)
+            justified = set()
+            for other in names:
+                if other in queries:
+                    justified |= queries[other]['ancestors']
+            names -= ancestors - justified
+        _store_collections(record, names)
+        if position % batch_size == 0:
+            self.update_state(state='PROGRESS',
+                              meta=dict(current=position, total=total))
+
+    _set_reclist(name, new)
+    for ancestor in ancestors:
+        kept = intbitset()
+        for child in get_collection_allchildren(ancestor):
+            if child != name and child in queries:
+                kept |= get_collection_reclist(child) & removed
+        _set_reclist(ancestor, (get_collection_reclist(ancestor) | added) -
+                     (removed - kept))
+
+    return dict(current=total, total=total, added=len(added),
+                removed=len(removed))
+
+
+@celery.task()
+def recount_collection_facets(id_collection):
+    """Recompute facet value counts after a change of facet layout.
+
+    Descendants may inherit the layout, so they are recounted as well.
+    """
+    from .cache import get_collection_allchildren
+    from .facets import rebuild_facet_counts
+    from .models import Collection
+
+    collection = Collection.query.get(id_collection)
+    if collection is None:
+        return
+    rebuild_facet_counts(names=get_collection_allchildren(collection.name))
@@ -21,8 +21,8 @@
 
 from __future__ import unicode_literals
 
-from flask import Blueprint, abort, flash, g, redirect, render_template, \
-    request, url_for
+from flask import Blueprint, Response, abort, flash, g, jsonify, \
+    redirect, render_template, request, url_for
 from flask_breadcrumbs import register_breadcrumb
 from flask_login import current_user, login_required
 
@@ -30,10 +30,12 @@ from invenio.base.decorators import templated
 from invenio.base.i18n import _, language_list_long
 from invenio.ext.principal import permission_required
 from invenio.ext.sqlalchemy import db
+from sqlalchemy.exc import IntegrityError
 
+from .. import metrics, query_budget
 from ..forms import CollectionForm, TranslationsForm
 from ..models import Collection, CollectionCollection, Collectionname, \
-    CollectionPortalbox, Portalbox
+    CollectionPortalbox, FacetCollection, Portalbox
 
 
 def not_guest():
@@ -45,6 +47,8 @@ blueprint = Blueprint('collections_admin', __name__,
                       template_folder='../templates'
                       )
 
+query_budget.register(blueprint)
+
 
 @blueprint.route('/', methods=['GET', 'POST'])
 @blueprint.route('/index', methods=['GET', 'POST'])
@@ -164,12 +168,31 @@ def update(id_collection):
     form = CollectionForm(request.form)
     if request.method == 'POST':  # and form.validate():
         collection = Collection.query.get_or_404(id_collection)
+        old_dbquery = collection.dbquery
         form.populate_obj(collection)
         db.session.commit()
         flash(_('Collection was updated'), "info")
+        if collection.dbquery != old_dbquery:
+            from ..tasks import reclassify_collection
+            task = reclassify_collection.delay(collection.id, old_dbquery,
+                                               collection.dbquery)
+            flash(_('Records are being reclassified, see %(url)s',
+                    url=url_for('.reclassify_status', task_id=task.id)),
+                  "info")
         return redirect(url_for('.index'))
 
 
+@blueprint.route('/collection/reclassify/<task_id>', methods=['GET'])
+@login_required
+@permission_required('cfgwebsearch')
+def reclassify_status(task_id):
+    """Return progress of a reclassification task."""
+    from ..tasks import reclassify_collection
+    result = reclassify_collection.AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+    return jsonify(state=result.state, **info)
+
+
 @blueprint.route('/collection/new', methods=['GET', 'POST'])
 @blueprint.route('/collection/add', methods=['GET', 'POST'])
 @login_required
@@ -248,3 +271,48 @@ def edit_portalbox():
     """Edit portal box."""
     portalbox = Portalbox.query.get(request.args.get_or_404('id', 0, type=int))
     return dict(portalbox=portalbox)
+
+
+@blueprint.route('/metrics', methods=['GET'])
+@login_required
+@permission_required('cfgwebsearch')
+def show_metrics():
+    """Return collection metrics in statsd-like text format."""
+    sink = metrics.get_sink()
+    if not isinstance(sink, metrics.MemorySink):
+        abort(404)
+    return Response(metrics.format_statsd(sink), mimetype='text/plain')
+
+
+@blueprint.route('/collection/<int:id_collection>/facets', methods=['POST'])
+@login_required
+@permission_required('cfgwebsearch')
+def replace_facets(id_collection):
+    """Replace the whole facet layout of a collection.
+
+    Facet names are given in ``facet_name`` and their positions in
+    ``order``; without ``order`` the names are numbered in given order.
+    Facet value counts are recomputed in the background.
+    """
+    from ..tasks import recount_collection_facets
+
+    Collection.query.get_or_404(id_collection)
+    names = request.form.getlist('facet_name')
+    orders = request.form.getlist('order', type=int) or \
+        range(1, len(names) + 1)
+    if len(orders) != len(names):
+        abort(400)
+    try:
+        FacetCollection.replace_layout(id_collection, zip(orders, names))
+        db.session.commit()
+    except ValueError:
+        db.session.rollback()
+        abort(400)
+    except IntegrityError:
+        db.session.rollback()
+        abort(409)
+    recount_collection_facets.delay(id_collection)
+    return jsonify(facets=[
+        dict(order=order, facet_name=facet_name)
+        for order, facet_name in sorted(zip(orders, names))
+    ])
@@ -20,13 +20,14 @@
 
 import warnings
 
-from flask import Blueprint, current_app, g, redirect, render_template, \
-    request, url_for
+from flask import Blueprint, current_app, g, jsonify, redirect, \
+    render_template, request, url_for
 from flask_breadcrumbs import current_breadcrumbs, default_breadcrumb_root, \
     register_breadcrumb
 from flask_menu import register_menu
 
 from invenio.base.decorators import templated, wash_arguments
+from invenio.base.globals import cfg
 from invenio.base.i18n import _
 from invenio.ext.template.context_processor import \
     register_template_context_processor
@@ -34,6 +35,12 @@ from invenio.utils.text import slugify
 from invenio_formatter import format_record
 from invenio_search.forms import EasySearchForm
 
+from .. import metrics, query_budget, warmup
+from ..access import get_accessible_collection_ids
+from ..cache import collection_id_cache, get_coll_i18nname, \
+    get_collection_name_index
+from ..decorators import check_collection
+from ..external import get_collection_engines, search_engines
 from ..models import Collection
 
 blueprint = Blueprint('collections', __name__, url_prefix='',
@@ -44,6 +51,8 @@ blueprint = Blueprint('collections', __name__, url_prefix='',
 
 default_breadcrumb_root(blueprint, '.')
 
+query_budget.register(blueprint)
+
 
 @blueprint.route('/index.html', methods=['GET', 'POST'])
 @blueprint.route('/index.py', methods=['GET', 'POST'])
@@ -51,6 +60,7 @@ default_breadcrumb_root(blueprint, '.')
 @templated('search/index.html')
 @register_menu(blueprint, 'main.collection', _('Search'), order=1)
 @register_breadcrumb(blueprint, '.', _('Home'))
+@metrics.timed('views.index')
 def index():
     """Render the homepage."""
     # legacy app support
@@ -75,8 +85,38 @@ def index():
     return dict(collection=collection)
 
 
+# Names of templates chosen for collection pages keyed by id and name.
+_collection_templates = {}
+
+
+def get_collection_template(collection):
+    """Return name of the template rendering a collection page.
+
+    It is the first existing of collection specific templates named by
+    its identifier or slugified name and the default template.  The
+    choice is cached unless templates are reloaded automatically.
+    """
+    key = (collection.id, collection.name)
+    template = _collection_templates.get(key)
+    if template is None:
+        template = current_app.jinja_env.select_template([
+            'search/collection_{0}.html'.format(collection.id),
+            'search/collection_{0}.html'.format(
+                slugify(collection.name, '_')),
+            'search/collection.html']).name
+        if not current_app.jinja_env.auto_reload:
+            _collection_templates[key] = template
+    return template
+
+
+def clear_collection_templates():
+    """Forget templates chosen for collection pages."""
+    _collection_templates.clear()
+
+
 @blueprint.route('/collection/', methods=['GET', 'POST'])
 @blueprint.route('/collection/<name>', methods=['GET', 'POST'])
+@metrics.timed('views.collection')
 def collection(name=None):
     """Render the collection page.
 
@@ -87,8 +127,7 @@ def collection(name=None):
     if name is None:
         return redirect(url_for('.collection',
                                 name=current_app.config['CFG_SITE_NAME']))
-    collection = Collection.query.filter(Collection.name == name) \
-                                 .first_or_404()
+    collection = Collection.get_by_name_or_404(name)
 
     @register_template_context_processor
     def index_context():
@@ -99,7 +138,79 @@ def collection(name=None):
             easy_search_form=EasySearchForm(csrf_enabled=False),
             breadcrumbs=breadcrumbs)
 
-    return render_template([
-        'search/collection_{0}.html'.format(collection.id),
-        'search/collection_{0}.html'.format(slugify(name, '_')),
-        'search/collection.html'], collection=collection)
+    return render_template(get_collection_template(collection),
+                           collection=collection)
+
+
+def collection_name_from_url():
+    """Return collection name from URL rule argument 'name'."""
+    return request.view_args.get('name')
+
+
+@blueprint.route('/collection/<name>/external', methods=['GET'])
+@check_collection(name_getter=collection_name_from_url)
+@wash_arguments({'p': (unicode, ''),
+                 'rg': (int, 0)})
+@metrics.timed('views.external')
+def external(collection, name, p, rg):
+    """Return counts and previews of hosted and external collections."""
+    limit = min(max(rg, 0), cfg['COLLECTIONS_EXTERNAL_MAX_PREVIEW_SIZE'])
+    results = search_engines(get_collection_engines(collection), p,
+                             limit=limit or None) if p else {}
+    return jsonify(results=dict(
+        (engine, result._asdict() if result is not None else None)
+        for engine, result in results.items()
+    ))
+
+
+@blueprint.route('/collection/<name>/facets', methods=['GET'])
+@check_collection(name_getter=collection_name_from_url)
+@wash_arguments({'limit': (int, 0)})
+@metrics.timed('views.facets')
+def facets(collection, name, limit):
+    """Return precomputed facet value counts of a collection."""
+    from ..facets import get_facet_counts
+    return jsonify(facets=[
+        dict(name=facet_name,
+             values=[dict(value=value, count=count)
+                     for value, count in values])
+        for facet_name, values in get_facet_counts(collection,
+                                                   limit=limit or None)
+    ])
+
+
+@blueprint.route('/collection/autocomplete', methods=['GET'])
+@wash_arguments({'q': (unicode, ''),
+                 'limit': (int, 0)})
+@metrics.timed('views.autocomplete')
+def autocomplete(q, limit):
+    """Return names of accessible collections starting with given prefix."""
+    limit = min(limit or cfg['COLLECTIONS_AUTOCOMPLETE_LIMIT'],
+                cfg['COLLECTIONS_AUTOCOMPLETE_LIMIT'])
+    names = []
+    if q:
+        accessible = get_accessible_collection_ids()
+        ids = collection_id_cache.cache
+        names = get_collection_name_index().prefix(
+            q, limit=limit,
+            accept=lambda name: name in ids and ids[name] in accessible)
+    return jsonify(results=[
+        dict(name=name, title=get_coll_i18nname(
+            name, g.ln, verify_cache_timestamp=False))
+        for name in names
+    ])
+
+
+@blueprint.route('/collections/ready', methods=['GET'])
+def ready():
+    """Report whether collection caches are warm, warming them up first."""
+    if not warmup.is_ready():
+        try:
+            warmup.warmup_caches()
+        except Exception:
+            current_app.logger.exception('Warmup of collection caches '
+                                         'failed.')
+    response = jsonify(ready=warmup.is_ready())
+    if not warmup.is_ready():
+        response.status_code = 503
+    return response
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Warm up collection caches before forking workers.
+
+Add the module to the application extensions and enable warmup:
+
+.. code-block:: python
+
+    EXTENSIONS = [..., 'invenio_collections.warmup']
+    COLLECTIONS_WARMUP_ON_STARTUP = True
+
+When the application is created in the master process (e.g. ``gunicorn
+--preload``), all caches are filled once there and the forked workers
+share them copy-on-write.  Database connections opened during warmup are
+closed so that workers never share them.
+
+Caches that were not warmed up at startup are warmed up by the first
+request of ``/collections/ready``, so a readiness probe keeps a worker
+out of rotation only until its caches are filled.
+"""
+
+import gc
+import threading
+
+from . import metrics
+
+_ready = threading.Event()
+
+
+def warmup_caches():
+    """Fill collection caches, compile queries and resolve templates."""
+    from .cache import collection_allchildren_cache, \
+        collection_facets_cache, collection_hitset_cache, \
+        collection_i18nname_cache, collection_id_cache, \
+        collection_name_index_cache, restricted_collection_cache
+    from .models import Collection
+    from .recordext.functions.get_record_collections import \
+        collection_queries_cache
+    from .views.collections import get_collection_template
+
+    with metrics.timer('warmup'):
+        for cache in (collection_allchildren_cache,
+                      restricted_collection_cache,
+                      collection_i18nname_cache,
+                      collection_hitset_cache,
+                      collection_name_index_cache,
+                      collection_id_cache,
+                      collection_facets_cache,
+                      collection_queries_cache):
+            cache.recreate_cache_if_needed()
+        for collection in Collection.query:
+            get_collection_template(collection)
+    _ready.set()
+
+
+def is_ready():
+    """Return ``True`` when caches of this process have been warmed up."""
+    return _ready.is_set()
+
+
+def setup_app(app):
+    """Warm up caches when the application is created."""
+    if not app.config.get('COLLECTIONS_WARMUP_ON_STARTUP'):
+        return
+    from invenio.ext.sqlalchemy import db
+
+    with app.app_context():
+        warmup_caches()
+        db.session.remove()
+        db.engine.dispose()
+    # Keep the warm objects out of future collections so that the garbage
+    # collector does not touch (and copy) their pages in workers.
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Benchmarks of collection tree and classification hot paths.
+
+Every benchmark builds a synthetic collection tree in an SQLite database
+and reports its timings as JSON:
+
+.. code-block:: console
+
+    $ python -m tests.benchmarks --sizes 1000,10000,50000 \
+        --output benchmarks.json
+
+Benchmarks are registered with :func:`benchmark` and receive the
+:class:`~tests.benchmarks.tree.SyntheticTree` they run against.  A failing
+benchmark is reported with its error instead of stopping the run.
+"""
+
+from __future__ import division
+
+import time
+import traceback
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register benchmark function under given name.
+
+    The function receives a tree and returns a callable to be timed and
+    optionally the number of operations it performs.
+    """
+    def decorator(f):
+        BENCHMARKS.append((name, f))
+        return f
+    return decorator
+
+
+def measure(name, tree, setup, repeat=3):
+    """Run one benchmark and return its result dictionary."""
+    result = dict(benchmark=name, collections=tree.size, shape=tree.shape,
+                  depth=tree.depth, records=len(tree.records))
+    timings = []
+    try:
+        for dummy in range(repeat):
+            tree.reset()
+            prepared = setup(tree)
+            func, operations = prepared if isinstance(prepared, tuple) \
+                else (prepared, 1)
+            start = time.time()
+            func()
+            timings.append(time.time() - start)
+    except Exception as e:
+        result['error'] = '{0}: {1}'.format(e.__class__.__name__, e)
+        result['traceback'] = traceback.format_exc()
+        return result
+
+    result.update(
+        repeat=repeat,
+        operations=operations,
+        min=min(timings),
+        max=max(timings),
+        mean=sum(timings) / len(timings),
+        ops_per_second=operations / min(timings) if min(timings) else None,
+    )
+    return result
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Run benchmarks and write results as JSON."""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from . import BENCHMARKS, measure
+from .plans import check_plans
+from .tree import SHAPES, SyntheticTree
+
+
+def create_app(database):
+    """Create application using given SQLite database."""
+    from invenio.base.factory import create_app
+    return create_app(
+        SQLALCHEMY_DATABASE_URI='sqlite:///{0}'.format(database),
+        DEBUG=False,
+        TESTING=True,
+    )
+
+
+def main(argv=None):
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000,50000',
+                        help='comma separated numbers of collections')
+    parser.add_argument('--shapes', default=','.join(sorted(SHAPES)),
+                        help='comma separated tree shapes')
+    parser.add_argument('--records', type=int, default=1000,
+                        help='number of records to classify')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of every benchmark')
+    parser.add_argument('--only', default='',
+                        help='comma separated benchmark name prefixes')
+    parser.add_argument('--plans', action='store_true',
+                        help='check query plans of hot lookups')
+    parser.add_argument('--output', default='-',
+                        help='output file, standard output by default')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    app = create_app(os.path.join(directory, 'benchmarks.db'))
+    only = tuple(name for name in args.only.split(',') if name)
+    results = []
+    try:
+        with app.app_context():
+            from .suite import register_data_cachers
+            register_data_cachers()
+            for size in [int(size) for size in args.sizes.split(',')]:
+                for shape in args.shapes.split(','):
+                    tree = SyntheticTree(app, size, shape,
+                                         records=args.records)
+                    tree.create()
+                    with tree.legacy_stubs():
+                        if args.plans:
+                            from invenio.ext.sqlalchemy import db
+                            for result in check_plans(db.engine):
+                                result.update(benchmark='plan',
+                                              collections=size, shape=shape)
+                                print('plan {query} {collections} {shape}: '
+                                      '{0}'.format(result.get('error', 'ok'),
+                                                   **result), file=sys.stderr)
+                                results.append(result)
+                        for name, setup in BENCHMARKS:
+                            if only and not name.startswith(only):
+                                continue
+                            result = measure(name, tree, setup,
+                                             repeat=args.repeat)
+                            print('{benchmark} {collections} {shape}: '
+                                  '{0}'.format(result.get('min',
+                                                          result.get('error')),
+                                               **result), file=sys.stderr)
+                            results.append(result)
+    finally:
+        shutil.rmtree(directory)
+
+    report = dict(
+        created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results,
+    )
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    else:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Benchmarks of collection tree, caches and classification."""
+
+import random
+
+from . import benchmark
+
+SAMPLE_SIZE = 100
+"""Number of leaf collections used by per-collection benchmarks."""
+
+
+def sample_leaves(tree):
+    """Return loaded sample of leaf collections."""
+    from invenio_collections.models import Collection
+    ids = random.Random(tree.seed).sample(
+        tree.leaves, min(SAMPLE_SIZE, len(tree.leaves)))
+    return Collection.query.filter(Collection.id.in_(ids)).all()
+
+
+@benchmark('descendants_ids')
+def descendants_ids(tree):
+    """Compute descendants of the root collection."""
+    from invenio_collections.models import Collection
+    root = Collection.query.get(1)
+    return lambda: root.descendants_ids
+
+
+@benchmark('ancestors_ids')
+def ancestors_ids(tree):
+    """Compute ancestors of sampled leaf collections."""
+    leaves = sample_leaves(tree)
+
+    def run():
+        for collection in leaves:
+            collection.ancestors_ids
+    return run, len(leaves)
+
+
+@benchmark('breadcrumbs')
+def breadcrumbs(tree):
+    """Build breadcrumbs of sampled leaf collections."""
+    leaves = sample_leaves(tree)
+
+    def run():
+        with tree.app.test_request_context():
+            for collection in leaves:
+                collection.breadcrumbs(ln='en')
+    return run, len(leaves)
+
+
+@benchmark('collection_queries')
+def collection_queries(tree):
+    """Compile queries of all regular collections."""
+    from invenio_collections.recordext.functions import \
+        get_record_collections
+    return lambda: len(get_record_collections.queries)
+
+
+@benchmark('get_record_collections')
+def record_collections(tree):
+    """Classify all records with precompiled collection queries."""
+    from invenio_collections.recordext.functions import \
+        get_record_collections
+    len(get_record_collections.queries)
+
+    def run():
+        for record in tree.records:
+            get_record_collections.get_record_collections(
+                record, recreate_cache_if_needed=False)
+    return run, len(tree.records)
+
+
+def register_data_cachers():
+    """Register fill benchmark for every data cacher in ``cache.py``."""
+    from invenio_collections import cache
+
+    for name, value in sorted(vars(cache).items()):
+        if isinstance(value, type) and \
+                issubclass(value, cache.CollectionDataCacher) and \
+                value.name is not None:
+            # Instantiating a data cacher runs its cache filler.
+            benchmark('cache_filler.{0}'.format(name))(
+                lambda tree, cacher=value: cacher)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Synthetic collection trees stored in SQLite."""
+
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from intbitset import intbitset
+from mock import patch
+
+SHAPES = {
+    'wide': lambda rng: 50,
+    'balanced': lambda rng: 10,
+    'deep': lambda rng: 2,
+    'mixed': lambda rng: rng.randint(1, 20),
+    'narrow': lambda rng: rng.choice((1, 1, 2)),
+}
+"""Fan-out of a new parent collection for every tree shape."""
+
+
+def generate_edges(size, shape, seed=0):
+    """Return ``(dad, son)`` pairs of a tree with given size and shape.
+
+    Collections are attached breadth-first, the fan-out of every parent
+    is given by the shape.  Collection ``1`` is the root.
+    """
+    rng = random.Random(seed)
+    fanout = SHAPES[shape]
+    edges = []
+    queue = deque([(1, fanout(rng))])
+    children = defaultdict(int)
+    for id_son in range(2, size + 1):
+        id_dad, limit = queue[0]
+        edges.append((id_dad, id_son))
+        children[id_dad] += 1
+        if children[id_dad] >= limit:
+            queue.popleft()
+        queue.append((id_son, fanout(rng)))
+    return edges
+
+
+class SyntheticTree(object):
+
+    """Collection tree with records for benchmarking.
+
+    Leaf collections are regular collections defined by a ``980`` query,
+    all others are virtual.  Every second collection has an English I18N
+    name.  Records are kept in memory, each belongs to one leaf.
+    """
+
+    def __init__(self, app, size, shape, records=1000, seed=0):
+        """Initialize tree parameters."""
+        self.app = app
+        self.size = size
+        self.shape = shape
+        self.nb_records = records
+        self.seed = seed
+        self.depth = 0
+        self.leaves = []
+        self.records = []
+        self.reclists = {}
+        self.updated = None
+
+    def create(self):
+        """Create database tables and fill them with the tree."""
+        from invenio.ext.sqlalchemy import db
+        from invenio_collections.models import Collection, \
+            CollectionCollection, Collectionname
+
+        edges = generate_edges(self.size, self.shape, seed=self.seed)
+        dads = set(id_dad for id_dad, dummy in edges)
+        depth = {1: 0}
+        for id_dad, id_son in edges:
+            depth[id_son] = depth[id_dad] + 1
+        self.depth = max(depth.values())
+        self.leaves = [id_ for id_ in range(1, self.size + 1)
+                       if id_ not in dads]
+
+        db.drop_all()
+        db.create_all()
+        db.session.execute(Collection.__table__.insert(), [
+            dict(id=id_, name=self.name(id_),
+                 dbquery=None if id_ in dads else
+                 '980:"COLL{0}"'.format(id_))
+            for id_ in range(1, self.size + 1)
+        ])
+        db.session.execute(CollectionCollection.__table__.insert(), [
+            dict(id_dad=id_dad, id_son=id_son, type='r', score=0)
+            for id_dad, id_son in edges
+        ])
+        db.session.execute(Collectionname.__table__.insert(), [
+            dict(id_collection=id_, ln='en', type='ln',
+                 value='{0} (en)'.format(self.name(id_)))
+            for id_ in range(1, self.size + 1, 2)
+        ])
+        db.session.commit()
+
+        rng = random.Random(self.seed)
+        self.records = []
+        self.reclists = defaultdict(intbitset)
+        for recid in range(1, self.nb_records + 1):
+            leaf = rng.choice(self.leaves)
+            self.records.append({
+                'recid': recid,
+                'collections': [{'primary': 'COLL{0}'.format(leaf)}],
+            })
+            self.reclists[self.name(leaf)].add(recid)
+        self.updated = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    @contextmanager
+    def legacy_stubs(self):
+        """Answer MySQL-only legacy lookups from the tree.
+
+        Table update times are the creation time of the tree and record
+        lists of leaf collections are the records of their ``980`` values.
+        """
+        def get_table_update_time(tablename, *args, **kwargs):
+            return self.updated
+
+        def get_collection_reclist(name, *args, **kwargs):
+            return intbitset(self.reclists.get(name, ()))
+
+        with patch('invenio.legacy.dbquery.get_table_update_time',
+                   side_effect=get_table_update_time), \
+                patch('invenio.legacy.search_engine.get_collection_reclist',
+                      side_effect=get_collection_reclist):
+            yield
+
+    def name(self, id_):
+        """Return name of collection with given identifier."""
+        if id_ == 1:
+            return self.app.config['CFG_SITE_NAME']
+        return 'Collection {0}'.format(id_)
+
+    def reset(self):
+        """Forget loaded collections and all collection caches.
+
+        Caches of a previous tree may have been filled in the second this
+        tree was created, so they are invalidated explicitly.
+        """
+        from invenio.ext.sqlalchemy import db
+        from invenio_collections import cache
+        from invenio_collections.recordext.functions import \
+            get_record_collections
+
+        db.session.expunge_all()
+        for value in vars(cache).values():
+            if isinstance(value, type) and \
+                    issubclass(value, cache.CollectionDataCacher) and \
+                    value.name is not None:
+                cache.invalidate_cache(value.name)
+        get_record_collections.reset_queries()
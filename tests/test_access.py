@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test collections accessible to users."""
+
+from collections import OrderedDict
+
+from intbitset import intbitset
+from mock import Mock, patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class AccessibleCollectionIdsTest(InvenioTestCase):
+
+    """Test accessible collections stored in the session."""
+
+    def setUp(self):
+        """Patch tables, caches and the session."""
+        from invenio_collections import access
+
+        self.times = dict((table, '2015-01-01 10:00:00')
+                          for table in access.ACCESS_TABLES)
+        self.restricted = Mock(timestamp='2015-01-01 10:00:05')
+        self.ids = Mock(timestamp='2015-01-01 10:00:05')
+        self.compute = Mock(side_effect=lambda user: intbitset([1, 2]))
+        self.patches = [
+            patch('invenio.legacy.dbquery.get_table_update_time',
+                  side_effect=lambda table: self.times[table]),
+            patch.object(access, 'restricted_collection_cache',
+                         self.restricted),
+            patch.object(access, 'collection_id_cache', self.ids),
+            patch.object(access, 'compute_accessible_collection_ids',
+                         self.compute),
+            patch.object(access, 'current_user', Mock(
+                get_id=Mock(return_value=1))),
+            patch.object(access, 'session', {}),
+        ]
+        for item in self.patches:
+            item.start()
+
+    def tearDown(self):
+        """Stop patches."""
+        for item in self.patches:
+            item.stop()
+
+    def test_other_process(self):
+        """Reuse session value in processes filling caches at other times."""
+        from invenio_collections.access import get_accessible_collection_ids
+
+        self.assertEqual(get_accessible_collection_ids(), intbitset([1, 2]))
+        self.restricted.timestamp = self.ids.timestamp = '2015-01-01 11:00:00'
+        self.assertEqual(get_accessible_collection_ids(), intbitset([1, 2]))
+        self.assertEqual(self.compute.call_count, 1)
+        self.assertTrue(self.restricted.recreate_cache_if_needed.called)
+        self.assertTrue(self.ids.recreate_cache_if_needed.called)
+
+    def test_table_change(self):
+        """Recompute once any of the tables changes."""
+        from invenio_collections.access import get_accessible_collection_ids
+
+        get_accessible_collection_ids()
+        self.times['user_accROLE'] = '2015-01-01 10:00:02'
+        get_accessible_collection_ids()
+        get_accessible_collection_ids()
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_not_timestamp(self):
+        """Never store collections when an update time is unknown."""
+        from invenio_collections.access import get_accessible_collection_ids
+
+        self.times['accROLE'] = None
+        get_accessible_collection_ids()
+        get_accessible_collection_ids()
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_stale_cache(self):
+        """Never store collections computed from outdated caches."""
+        from invenio_collections.access import get_accessible_collection_ids
+
+        self.restricted.timestamp = '2015-01-01 09:00:00'
+        get_accessible_collection_ids()
+        get_accessible_collection_ids()
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_other_user(self):
+        """Compute collections of other users without the session."""
+        from invenio_collections import access
+
+        self.assertEqual(access.get_accessible_collection_ids(user=5),
+                         intbitset([1, 2]))
+        self.compute.assert_called_once_with(5)
+        self.assertEqual(access.session, {})
+
+
+class FilterHitsTest(InvenioTestCase):
+
+    """Test hiding records of restricted collections."""
+
+    def setUp(self):
+        """Patch caches of restricted collections and their records."""
+        from invenio_collections import access
+
+        hitsets = {'Public': intbitset([1, 2, 3, 4]),
+                   'Theses': intbitset([2, 3]),
+                   'Drafts': intbitset([3, 4]),
+                   'Secret': intbitset([5])}
+        self.patches = [
+            patch.object(access, 'restricted_collection_cache', Mock(
+                cache=['Theses', 'Drafts', 'Gone'])),
+            patch.object(access, 'collection_id_cache', Mock(
+                cache={'Public': 1, 'Theses': 2, 'Drafts': 3},
+                timestamp='2015-01-01 10:00:00')),
+            patch.object(access, 'collection_hitset_cache', Mock(
+                timestamp='2015-01-01 10:00:00')),
+            patch.object(access, 'get_collection_hitset',
+                         side_effect=lambda name, **kwargs: hitsets[name]),
+            patch.object(access, '_hidden_recids', OrderedDict()),
+        ]
+        for item in self.patches:
+            item.start()
+
+    def tearDown(self):
+        """Stop patches."""
+        for item in self.patches:
+            item.stop()
+
+    def test_hidden(self):
+        """Hide records of inaccessible collections only."""
+        from invenio_collections.access import get_hidden_recids
+
+        self.assertEqual(get_hidden_recids(intbitset([1])),
+                         intbitset([2, 3, 4]))
+        self.assertEqual(get_hidden_recids(intbitset([1, 2, 3])),
+                         intbitset())
+
+    def test_any_accessible(self):
+        """Show records of any accessible restricted collection."""
+        from invenio_collections.access import get_hidden_recids
+
+        self.assertEqual(get_hidden_recids(intbitset([1, 2])),
+                         intbitset([4]))
+        self.assertEqual(get_hidden_recids(intbitset([1, 3])),
+                         intbitset([2]))
+
+    def test_filter_hits(self):
+        """Filter hits using collections accessible to the user."""
+        from invenio_collections import access
+
+        with patch.object(access, 'get_accessible_collection_ids',
+                          return_value=intbitset([1, 3])) as accessible:
+            self.assertEqual(
+                access.filter_hits_for_user(intbitset([1, 2, 3, 5]), 7),
+                intbitset([1, 3, 5]))
+        accessible.assert_called_once_with(7)
+
+    def test_compute(self):
+        """Drop restricted collections the user is not authorized for."""
+        from invenio_collections import access
+
+        with patch('invenio_access.engine.acc_authorize_action',
+                   side_effect=lambda user, action, collection: (
+                       0 if collection == 'Drafts' else 1, '')):
+            self.assertEqual(access.compute_accessible_collection_ids(7),
+                             intbitset([1, 3]))
+
+
+TEST_SUITE = make_test_suite(AccessibleCollectionIdsTest, FilterHitsTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
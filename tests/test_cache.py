@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test computations behind collection caches."""
+
+import threading
+import time
+import warnings
+
+from mock import Mock, patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class DescendantsFromEdgesTest(InvenioTestCase):
+
+    """Test descendants computed from collection tree edges."""
+
+    def descendants(self, ids, edges):
+        """Return descendants as sorted lists."""
+        from invenio_collections.cache import descendants_from_edges
+        return dict((id_, list(value)) for id_, value in
+                    descendants_from_edges(ids, edges).items())
+
+    def test_tree(self):
+        """Include the collection and all its descendants."""
+        self.assertEqual(
+            self.descendants([1, 2, 3, 4, 5], [(1, 2), (1, 3), (3, 4)]),
+            {1: [1, 2, 3, 4], 2: [2], 3: [3, 4], 4: [4], 5: [5]})
+
+    def test_shared_son(self):
+        """Count a collection with several dads once."""
+        self.assertEqual(
+            self.descendants([1, 2, 3, 4], [(1, 2), (1, 3), (2, 4),
+                                            (3, 4)]),
+            {1: [1, 2, 3, 4], 2: [2, 4], 3: [3, 4], 4: [4]})
+
+    def test_unknown_collections(self):
+        """Ignore edges of unknown collections."""
+        self.assertEqual(self.descendants([1, 2], [(1, 2), (2, 7), (8, 1)]),
+                         {1: [1, 2], 2: [2]})
+
+    def test_cycle(self):
+        """Return all reachable collections of cycles and their dads."""
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            descendants = self.descendants(
+                [1, 2, 3, 4], [(1, 2), (2, 3), (3, 2), (3, 4)])
+        self.assertEqual(descendants, {1: [1, 2, 3, 4], 2: [2, 3, 4],
+                                       3: [2, 3, 4], 4: [4]})
+        self.assertEqual(len(caught), 1)
+        self.assertTrue(issubclass(caught[0].category, RuntimeWarning))
+
+
+class InheritFromDadsTest(InvenioTestCase):
+
+    """Test values inherited down the collection tree."""
+
+    def inherit(self, ids, edges, own):
+        """Return inherited values."""
+        from invenio_collections.cache import inherit_from_dads
+        return inherit_from_dads(ids, edges, own)
+
+    def test_nearest_dad(self):
+        """Take the value of the nearest dad with one."""
+        self.assertEqual(
+            self.inherit([1, 2, 3, 4], [(1, 2, 1), (2, 3, 1), (3, 4, 1)],
+                         {1: 'a', 3: 'c'}),
+            {1: 'a', 2: 'a', 3: 'c', 4: 'c'})
+
+    def test_first_dad_by_score(self):
+        """Prefer the dad of the lowest score."""
+        self.assertEqual(
+            self.inherit([1, 2, 3], [(1, 3, 2), (2, 3, 1)],
+                         {1: 'a', 2: 'b'}),
+            {1: 'a', 2: 'b', 3: 'b'})
+
+    def test_without_value(self):
+        """Leave out collections without any value above them."""
+        self.assertEqual(self.inherit([1, 2, 3], [(1, 2, 1)], {3: 'c'}),
+                         {3: 'c'})
+
+    def test_unknown_edges(self):
+        """Ignore edges of unknown collections."""
+        self.assertEqual(self.inherit([1, 2], [(1, 2, 1), (7, 2, 0)],
+                                      {1: 'a', 7: 'x'}),
+                         {1: 'a', 2: 'a'})
+
+
+class NegativeCacheTest(InvenioTestCase):
+
+    """Test bounded cache of missed keys."""
+
+    def test_add_discard(self):
+        """Remember and forget keys."""
+        from invenio_collections.cache import NegativeCache
+        missing = NegativeCache(maxsize=10, ttl=60)
+        missing.add('a')
+        self.assertIn('a', missing)
+        self.assertNotIn('b', missing)
+        missing.discard('a')
+        self.assertNotIn('a', missing)
+
+    def test_maxsize(self):
+        """Drop the least recently added keys."""
+        from invenio_collections.cache import NegativeCache
+        missing = NegativeCache(maxsize=2, ttl=60)
+        for key in 'abc':
+            missing.add(key)
+        self.assertEqual(len(missing), 2)
+        self.assertNotIn('a', missing)
+        self.assertIn('c', missing)
+
+    def test_expiration(self):
+        """Forget keys after their time to live."""
+        from invenio_collections.cache import NegativeCache
+        missing = NegativeCache(maxsize=10, ttl=-1)
+        missing.add('a')
+        self.assertNotIn('a', missing)
+        self.assertEqual(len(missing), 0)
+
+    def test_config(self):
+        """Read limits from configuration when not given."""
+        from invenio_collections.cache import NegativeCache
+        self.app.config['COLLECTIONS_NEGATIVE_CACHE_SIZE'] = 3
+        self.app.config['COLLECTIONS_NEGATIVE_CACHE_TTL'] = 5
+        missing = NegativeCache()
+        self.assertEqual((missing.maxsize, missing.ttl), (3, 5))
+
+    def test_collection_table_change(self):
+        """Forget missing names once the collection table changes."""
+        from werkzeug.exceptions import NotFound
+        from invenio_collections import models
+        from invenio_collections.cache import NegativeCache
+
+        missing = NegativeCache(maxsize=10, ttl=60)
+        ids = Mock()
+        with patch.object(models, 'collection_name_missing', missing), \
+                patch.object(models, 'collection_id_cache', ids), \
+                patch.object(models.Collection, 'query') as query:
+            first = query.filter.return_value.first
+            first.return_value = None
+            for dummy in range(2):
+                self.assertRaises(NotFound,
+                                  models.Collection.get_by_name_or_404,
+                                  'Books')
+            self.assertEqual(first.call_count, 1)
+
+            # Another process created the collection.
+            ids.recreate_cache_if_needed.side_effect = missing.clear
+            first.return_value = collection = Mock()
+            self.assertIs(models.Collection.get_by_name_or_404('Books'),
+                          collection)
+
+
+def slow_cacher():
+    """Return filled cache whose next fills wait for ``release`` event.
+
+    The cache value is the number of fills and ``version`` is returned by
+    its timestamp verifier.
+    """
+    from invenio_collections.cache import CollectionDataCacher
+
+    class SlowCacher(CollectionDataCacher):
+        name = 'slow'
+
+        def __init__(self):
+            self.fills = 0
+            self.started = threading.Event()
+            self.release = threading.Event()
+            self.release.set()
+            self.version = '1970-01-01 00:00:00'
+            self.checks = []
+
+            def cache_filler():
+                self.fills += 1
+                self.started.set()
+                self.release.wait(5)
+                return self.fills
+
+            def timestamp_verifier():
+                self.checks.append(self.version)
+                return self.version
+
+            CollectionDataCacher.__init__(self, cache_filler,
+                                          timestamp_verifier)
+
+        def outdate(self):
+            """Make the tables newer and block the next fill."""
+            self.version = '9999-12-31 00:00:00'
+            self.started.clear()
+            self.release.clear()
+
+    cacher = SlowCacher()
+    if cacher.cache is None:
+        cacher.create_cache()
+    return cacher
+
+
+class BackgroundRefreshTest(InvenioTestCase):
+
+    """Test serving outdated caches while they are refilled."""
+
+    def setUp(self):
+        """Enable background refresh."""
+        self.app.config['COLLECTIONS_CACHE_BACKGROUND_REFRESH'] = True
+        self.app.config['COLLECTIONS_CACHE_MAX_STALENESS'] = 60
+
+    def test_refresh(self):
+        """Serve the outdated cache until one background fill is done."""
+        cacher = slow_cacher()
+        cacher.outdate()
+        cacher.recreate_cache_if_needed()
+        self.assertTrue(cacher.started.wait(5))
+        thread = cacher._refresh_thread
+        cacher.recreate_cache_if_needed()
+        self.assertIs(cacher._refresh_thread, thread)
+        self.assertEqual(cacher.cache, 1)
+
+        cacher.release.set()
+        thread.join(5)
+        self.assertEqual((cacher.cache, cacher.fills), (2, 2))
+        self.assertIsNone(cacher._stale_since)
+        self.assertIsNone(cacher._refresh_thread)
+
+    def test_max_staleness(self):
+        """Refresh synchronously a cache outdated for too long."""
+        cacher = slow_cacher()
+        cacher.version = '9999-12-31 00:00:00'
+        cacher._stale_since = time.time() - 61
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(cacher.cache, 2)
+        self.assertIsNone(cacher._refresh_thread)
+
+    def test_first_fill(self):
+        """Fill synchronously a cache without value."""
+        cacher = slow_cacher()
+        cacher.version = '9999-12-31 00:00:00'
+        cacher.cache = None
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(cacher.cache, 2)
+        self.assertIsNone(cacher._refresh_thread)
+
+
+class SingleFlightTest(InvenioTestCase):
+
+    """Test that concurrent checks fill an outdated cache once."""
+
+    def start(self, cacher):
+        """Check cache in a new thread and return the thread."""
+        def check():
+            with self.app.app_context():
+                cacher.recreate_cache_if_needed()
+
+        thread = threading.Thread(target=check)
+        thread.start()
+        return thread
+
+    def test_serve_current(self):
+        """Serve the current cache while another thread fills it."""
+        cacher = slow_cacher()
+        cacher.outdate()
+        thread = self.start(cacher)
+        self.assertTrue(cacher.started.wait(5))
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(cacher.cache, 1)
+
+        cacher.release.set()
+        thread.join(5)
+        self.assertEqual((cacher.cache, cacher.fills), (2, 2))
+
+    def test_wait_for_first_fill(self):
+        """Wait for the fill of a cache without value and skip own fill."""
+        cacher = slow_cacher()
+        cacher.outdate()
+        cacher.cache = None
+        first = self.start(cacher)
+        self.assertTrue(cacher.started.wait(5))
+        del cacher.checks[:]
+        second = self.start(cacher)
+        while not cacher.checks:
+            time.sleep(0.001)
+
+        cacher.release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual((cacher.cache, cacher.fills), (2, 2))
+
+    def test_invalidated(self):
+        """Fill an invalidated cache on its next check."""
+        from invenio_collections.cache import invalidate_cache
+
+        cacher = slow_cacher()
+        invalidate_cache('slow')
+        cacher.recreate_cache_if_needed()
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(cacher.fills, 2)
+
+
+class CollectionNameIndexTest(InvenioTestCase):
+
+    """Test lookups of collection names and their translations."""
+
+    def setUp(self):
+        """Build index of a few names."""
+        from invenio_collections.cache import CollectionNameIndex
+        self.index = CollectionNameIndex([
+            ('Articles', 'Articles'), ('Books', 'Books'),
+            ('Livres', 'Books'), ('Articles & Preprints', 'Articles'),
+            ('Preprints', 'Preprints'),
+        ])
+
+    def test_prefix(self):
+        """Match keys case-insensitively and return names once."""
+        self.assertEqual(self.index.prefix('art'), ['Articles'])
+        self.assertEqual(self.index.prefix('LIV'), ['Books'])
+        self.assertEqual(self.index.prefix(''),
+                         ['Articles', 'Books', 'Preprints'])
+        self.assertEqual(self.index.prefix('x'), [])
+
+    def test_prefix_limit(self):
+        """Stop after given number of names."""
+        self.assertEqual(self.index.prefix('', limit=2),
+                         ['Articles', 'Books'])
+
+    def test_prefix_accept(self):
+        """Return only accepted names and count them against the limit."""
+        self.assertEqual(
+            self.index.prefix('', limit=1,
+                              accept=lambda name: name != 'Articles'),
+            ['Books'])
+        self.assertEqual(
+            self.index.prefix('art', accept=lambda name: False), [])
+
+    def test_match(self):
+        """Match ``*`` patterns against whole keys."""
+        self.assertEqual(self.index.match('*prints'),
+                         ['Articles', 'Preprints'])
+        self.assertEqual(self.index.match('b*s'), ['Books'])
+        self.assertEqual(self.index.match('b*'), ['Books'])
+        self.assertEqual(self.index.match('book'), [])
+
+
+TEST_SUITE = make_test_suite(DescendantsFromEdgesTest, InheritFromDadsTest,
+                             NegativeCacheTest, BackgroundRefreshTest,
+                             SingleFlightTest, CollectionNameIndexTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test selective classification of records into collections."""
+
+from mock import Mock, patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+# Record keys of the keywords used by queries below.
+FIELD_TAGS = {'980': ['collections'], 'collection': ['collections']}
+
+# Records with parsed 980 fields.
+RECORDS = [
+    {'collections': [{'primary': 'BOOK'}]},
+    {'collections': [{'primary': 'BOOK REVIEW'}]},
+    {'collections': [{'primary': 'EBOOK'}]},
+    {'collections': [{'primary': 'book'}]},
+    {'collections': [{'primary': 'ARTICLE', 'secondary': 'BOOK'}]},
+    {'collections': [{'primary': 'ARTICLE'}, {'primary': 'BOOK'}]},
+    {'collections': [{'primary': 'BOOK'}, {'primary': 'DELETED'}]},
+]
+
+
+def get_field_tags(field, tagtype='marc'):
+    """Return record keys of a search field."""
+    return FIELD_TAGS.get(field, [])
+
+
+def keyword_keys(keyword):
+    """Map every keyword to the record key of the same name."""
+    return set([keyword])
+
+
+class QueryFieldsTest(InvenioTestCase):
+
+    """Test record keys referenced by collection queries."""
+
+    def fields(self, query):
+        """Return fields of parsed query."""
+        from invenio_collections.recordext.functions.get_record_collections \
+            import query_fields
+        from invenio_search.api import Query
+        return query_fields(Query(query), keyword_keys=keyword_keys)
+
+    def test_keywords(self):
+        """Collect keywords of all operands."""
+        self.assertEqual(self.fields('title:foo'), set(['title']))
+        self.assertEqual(
+            self.fields('title:foo AND NOT collection:"DELETED"'),
+            set(['title', 'collection']))
+        self.assertEqual(self.fields('title:foo OR author:bar'),
+                         set(['title', 'author']))
+
+    def test_any_field(self):
+        """Return ``None`` for terms without keyword."""
+        self.assertIsNone(self.fields('foo'))
+        self.assertIsNone(self.fields('title:foo OR bar'))
+
+    def test_collections(self):
+        """Return ``None`` for queries depending on other collections."""
+        self.assertIsNone(self.fields('_collections:"ARTICLE"'))
+
+
+class Marc980Test(InvenioTestCase):
+
+    """Test direct assignment of collections defined by 980 queries."""
+
+    def test_phrases_only(self):
+        """Leave word and pattern queries to the full match."""
+        from invenio_collections.recordext.functions.get_record_collections \
+            import marc980_keys
+
+        self.assertEqual(marc980_keys('980:"BOOK"'),
+                         [('primary', 'BOOK'), ('secondary', 'BOOK')])
+        self.assertEqual(marc980_keys('980__b:"BOOK REVIEW"'),
+                         [('secondary', 'BOOK REVIEW')])
+        self.assertIsNone(marc980_keys('980:BOOK'))
+        self.assertIsNone(marc980_keys('980:"BOOK*"'))
+        self.assertIsNone(marc980_keys('980:"BOOK" OR 980:"ARTICLE"'))
+
+    @patch('invenio_search.walkers.match_unit.get_field_tags',
+           get_field_tags)
+    def test_same_as_match(self):
+        """Assign verified 980 queries exactly as the full match."""
+        from invenio_collections.recordext.functions.get_record_collections \
+            import COLLECTIONS_DELETED_RECORDS, marc980_keys, \
+            marc980_verified, record_marc980_keys
+        from invenio_search.api import Query
+
+        verified = []
+        for dbquery in ('980:"BOOK"', '980:BOOK', '980__a:"BOOK"',
+                        '980:"BOOK REVIEW"'):
+            query = Query(COLLECTIONS_DELETED_RECORDS.format(dbquery=dbquery))
+            keys = marc980_keys(dbquery)
+            if keys is None or not marc980_verified(query, keys):
+                continue
+            verified.append(dbquery)
+            for record in RECORDS:
+                record_keys = record_marc980_keys(record)
+                if record_keys is not None:
+                    self.assertEqual(bool(record_keys & set(keys)),
+                                     query.match(record),
+                                     (dbquery, record))
+        # 980__a is not mapped to a record key, so it is not verified.
+        self.assertEqual(verified, ['980:"BOOK"', '980:"BOOK REVIEW"'])
+
+
+class CheckQueriesTest(InvenioTestCase):
+
+    """Test freshness checks of compiled collection queries."""
+
+    def test_once_per_context(self):
+        """Check tables once per application context unless forced."""
+        from invenio_collections.recordext.functions import \
+            get_record_collections as module
+
+        with patch.object(module, 'collection_queries_cache') as cache:
+            cache.cache = dict(queries={}, marc980={})
+            with self.app.app_context():
+                module.get_record_collections({})
+                module.get_record_collections({})
+                self.assertEqual(
+                    cache.recreate_cache_if_needed.call_count, 1)
+                module.check_queries(force=True)
+                self.assertEqual(
+                    cache.recreate_cache_if_needed.call_count, 2)
+            with self.app.app_context():
+                module.get_record_collections({})
+                module.get_record_collections(
+                    {}, recreate_cache_if_needed=False)
+            self.assertEqual(cache.recreate_cache_if_needed.call_count, 3)
+
+
+class UpdateCollectionsTest(InvenioTestCase):
+
+    """Test re-evaluation of collections on record update."""
+
+    def update(self, stored, sent):
+        """Send update signal and return assigned collections."""
+        from invenio_collections.recordext.functions import \
+            get_record_collections as module
+
+        queries = {
+            'Articles': dict(query=Mock(**{'match.return_value': True}),
+                             fields=set(['title']), marc980=None,
+                             ancestors=set()),
+            'Restricted': dict(query=Mock(**{'match.return_value': False}),
+                               fields=set(['secret']), marc980=None,
+                               ancestors=set()),
+        }
+        with patch.object(module, 'collection_queries_cache') as cache, \
+                patch('invenio_records.api.get_record',
+                      return_value=stored), \
+                patch('invenio_collections.facets.update_facet_counts'), \
+                patch('invenio_collections.reverse_index.'
+                      'update_record_collection_ids'):
+            cache.cache = dict(queries=queries, marc980={})
+            module.update_changed_collections(sent)
+        return sorted(sent['_collections'])
+
+    def test_sent_collections_are_ignored(self):
+        """Keep memberships of the stored record, not the sent ones."""
+        stored = {'recid': 1, 'title': 'a', '_collections': ['Articles']}
+        self.assertEqual(
+            self.update(stored, {'recid': 1, 'title': 'a',
+                                 '_collections': ['Articles', 'Restricted']}),
+            ['Articles'])
+        self.assertEqual(
+            self.update(stored, {'recid': 1, 'title': 'a',
+                                 '_collections': []}),
+            ['Articles'])
+
+    def test_changed_field(self):
+        """Evaluate queries referencing changed fields."""
+        stored = {'recid': 1, 'secret': 'a',
+                  '_collections': ['Restricted']}
+        self.assertEqual(
+            self.update(stored, {'recid': 1, 'secret': 'b',
+                                 '_collections': ['Restricted']}),
+            [])
+
+
+TEST_SUITE = make_test_suite(QueryFieldsTest, Marc980Test, CheckQueriesTest,
+                             UpdateCollectionsTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
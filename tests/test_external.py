@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test concurrent search of hosted and external collection engines."""
+
+import json
+import threading
+import time
+
+from mock import Mock, patch
+from six.moves import BaseHTTPServer, socketserver
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class EngineHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    """Answer every search with three hits, late on path ``/slow``."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        """Count new connections."""
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        """Return JSON search result."""
+        self.server.requests.append(self.path)
+        if self.path.startswith('/slow'):
+            time.sleep(self.server.delay)
+        body = json.dumps({'count': 3, 'hits': [1, 2, 3]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # Close kept-alive connection without telling the client.
+        self.close_connection = self.server.close_idle
+
+    def log_message(self, *args):
+        """Keep test output clean."""
+
+
+class EngineServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    """Local stand-in of remote search engines."""
+
+    daemon_threads = True
+    delay = 0.5
+    close_idle = False
+
+    def __init__(self):
+        """Listen on a free local port."""
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           EngineHandler)
+        self.connections = 0
+        self.requests = []
+
+    def handle_error(self, request, client_address):
+        """Ignore clients that gave up waiting for slow answers."""
+
+
+class ExternalSearchTest(InvenioTestCase):
+
+    """Test fan-out, timeouts, caching and connection reuse."""
+
+    def setUp(self):
+        """Start engine server and create engines."""
+        from invenio_collections import external
+
+        self.server = EngineServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.app.config['COLLECTIONS_EXTERNAL_CACHE_TTL'] = 60
+        self.app.config['COLLECTIONS_EXTERNAL_CACHE_SIZE'] = 100
+        external._results.clear()
+        url = 'http://127.0.0.1:{0}/{1}?p={{query}}&rg={{limit}}'
+        self.fast = external.HTTPEngine(
+            'fast', url.format(self.server.server_port, 'fast'), timeout=2)
+        self.slow = external.HTTPEngine(
+            'slow', url.format(self.server.server_port, 'slow'),
+            timeout=0.1)
+
+    def tearDown(self):
+        """Stop engine server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_slow_engine_times_out(self):
+        """Return results in time and ``None`` for late engines."""
+        from invenio_collections.external import ExternalResult, \
+            search_engines
+
+        start = time.time()
+        results = search_engines([self.fast, self.slow], 'ellis', limit=2)
+        self.assertLess(time.time() - start, self.server.delay)
+        self.assertEqual(results['fast'], ExternalResult(3, [1, 2]))
+        self.assertIsNone(results['slow'])
+
+    def test_result_is_cached(self):
+        """Query engine once for the same query and limit."""
+        from invenio_collections.external import search_engines
+
+        search_engines([self.fast], 'ellis', limit=2)
+        search_engines([self.fast], 'ellis', limit=2)
+        search_engines([self.fast], 'ellis', limit=5)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_timeout_is_not_cached(self):
+        """Query timed out engine again on next search."""
+        from invenio_collections.external import search_engines
+
+        search_engines([self.slow], 'ellis', limit=2)
+        results = search_engines([self.slow], 'ellis', limit=2)
+        self.assertIsNone(results['slow'])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_cache_is_bounded(self):
+        """Drop least recently used results over the size limit."""
+        from invenio_collections import external
+
+        self.app.config['COLLECTIONS_EXTERNAL_CACHE_SIZE'] = 2
+        for query in ('a', 'b', 'a', 'c'):
+            external.search_engines([self.fast], query, limit=2)
+        self.assertEqual(sorted(key[1] for key in external._results),
+                         ['a', 'c'])
+
+    def test_connection_is_reused(self):
+        """Send subsequent requests over one persistent connection."""
+        from invenio_collections.external import search_engines
+
+        for query in ('a', 'b', 'c'):
+            search_engines([self.fast], query, limit=2)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_closed_connection_is_retried(self):
+        """Resend request when the server closed the idle connection."""
+        from invenio_collections.external import ExternalResult, \
+            search_engines
+
+        self.server.close_idle = True
+        for query in ('a', 'b'):
+            results = search_engines([self.fast], query, limit=2)
+            self.assertEqual(results['fast'], ExternalResult(3, [1, 2]))
+        self.assertEqual(self.server.connections, 2)
+
+
+class ExternalViewTest(InvenioTestCase):
+
+    """Test external collection view."""
+
+    def test_limit_is_capped(self):
+        """Request at most the maximum preview size from engines."""
+        from invenio_collections.models import Collection
+
+        module = 'invenio_collections.views.collections.'
+        self.app.config['COLLECTIONS_EXTERNAL_MAX_PREVIEW_SIZE'] = 5
+        with patch.object(Collection, 'get_by_name_or_404',
+                          return_value=Mock(is_restricted=False)), \
+                patch(module + 'get_collection_engines', return_value=[]), \
+                patch(module + 'search_engines',
+                      return_value={}) as search_engines:
+            for rg in (0, 3, 1000):
+                self.client.get(
+                    '/collection/Books/external?p=ellis&rg={0}'.format(rg))
+        self.assertEqual(
+            [call[1]['limit'] for call in search_engines.call_args_list],
+            [None, 3, 5])
+
+
+TEST_SUITE = make_test_suite(ExternalSearchTest, ExternalViewTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test facet layouts and facet value counts."""
+
+from mock import patch
+from sqlalchemy import and_
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class ReplaceLayoutTest(InvenioTestCase):
+
+    """Test validation and storage of facet layouts."""
+
+    def replace(self, layout):
+        """Replace layout of collection 1 and return executed statements."""
+        from invenio_collections import models
+        from invenio_collections.models import FacetCollection
+
+        with patch.object(FacetCollection, 'query') as query, \
+                patch.object(models.db.session, 'execute') as execute, \
+                patch.object(models, 'invalidate_cache') as invalidate:
+            FacetCollection.replace_layout(1, layout)
+        return query, execute, invalidate
+
+    def test_duplicates_are_rejected(self):
+        """Refuse repeated orders and names before touching the table."""
+        from invenio_collections.models import FacetCollection
+
+        for layout in ([(1, 'author'), (1, 'year')],
+                       [(1, 'author'), (2, 'author')],
+                       [('first', 'author')]):
+            with patch.object(FacetCollection, 'query') as query:
+                self.assertRaises(ValueError, FacetCollection.replace_layout,
+                                  1, layout)
+            self.assertFalse(query.filter.called)
+
+    def test_replace(self):
+        """Delete old facets and insert the new ones at once."""
+        query, execute, invalidate = self.replace([('2', 'year'),
+                                                   (1, 'author')])
+        self.assertTrue(query.filter.return_value.delete.called)
+        self.assertEqual(execute.call_count, 1)
+        self.assertEqual(execute.call_args[0][1], [
+            dict(id_collection=1, order=2, facet_name='year'),
+            dict(id_collection=1, order=1, facet_name='author'),
+        ])
+        invalidate.assert_called_once_with('facets')
+
+    def test_empty_layout(self):
+        """Only delete old facets of an empty layout."""
+        query, execute, invalidate = self.replace([])
+        self.assertTrue(query.filter.return_value.delete.called)
+        self.assertFalse(execute.called)
+
+
+# Facet layouts of collections used below.
+LAYOUTS = {'Articles': ('author', 'year'), 'Books': ('year', )}
+
+
+class UpdateFacetCountsTest(InvenioTestCase):
+
+    """Test incremental facet value counts."""
+
+    def setUp(self):
+        """Use fixed facet layouts and record added counts."""
+        from invenio_collections import facets
+
+        self.app.config['COLLECTIONS_FACET_FIELDS'] = {}
+        self.added = {}
+        self.patches = [
+            patch.object(facets, 'collection_facets_cache'),
+            patch.object(facets, 'get_collection_facets',
+                         side_effect=lambda name, **kwargs:
+                         LAYOUTS.get(name, ())),
+            patch.object(facets, 'Collection'),
+            patch.object(facets, 'db', and_=and_),
+            patch.object(facets, '_add_count',
+                         side_effect=lambda table, id_collection, facet_name,
+                         value, count: self.added.__setitem__(
+                             (id_collection, facet_name, value), count)),
+        ]
+        mocks = [item.start() for item in self.patches]
+        self.facets_cache, self.get_collection_facets, collection = \
+            mocks[:3]
+        collection.query.filter.return_value.values.return_value = [
+            ('Articles', 1), ('Books', 2)]
+
+    def tearDown(self):
+        """Stop patches."""
+        for item in self.patches:
+            item.stop()
+
+    def test_new_record(self):
+        """Count values of every facet of every collection."""
+        from invenio_collections.facets import update_facet_counts
+
+        update_facet_counts(None, {'_collections': ['Articles', 'Books'],
+                                   'author': ['Ellis', 'Ellis', 'Higgs'],
+                                   'year': 2015})
+        self.assertEqual(self.added, {
+            (1, 'author', 'Ellis'): 1, (1, 'author', 'Higgs'): 1,
+            (1, 'year', '2015'): 1, (2, 'year', '2015'): 1})
+
+    def test_difference(self):
+        """Apply only the difference between record versions."""
+        from invenio_collections.facets import update_facet_counts
+
+        update_facet_counts(
+            {'_collections': ['Articles'], 'author': 'Ellis', 'year': 2014},
+            {'_collections': ['Articles'], 'author': 'Ellis', 'year': 2015})
+        self.assertEqual(self.added, {(1, 'year', '2014'): -1,
+                                      (1, 'year', '2015'): 1})
+
+    def test_names(self):
+        """Count only given collections."""
+        from invenio_collections.facets import update_facet_counts
+
+        update_facet_counts(None, {'_collections': ['Articles', 'Books'],
+                                   'year': 2015}, names=set(['Books']))
+        self.assertEqual(self.added, {(2, 'year', '2015'): 1})
+
+    def test_layouts_are_checked_once(self):
+        """Check facet layouts once per update, not per collection."""
+        from invenio_collections.facets import update_facet_counts
+
+        update_facet_counts(None, {'_collections': ['Articles', 'Books'],
+                                   'year': 2015})
+        self.assertEqual(
+            self.facets_cache.recreate_cache_if_needed.call_count, 1)
+        for call in self.get_collection_facets.call_args_list:
+            self.assertEqual(call[1], dict(recreate_cache_if_needed=False))
+
+
+class AddCountTest(InvenioTestCase):
+
+    """Test concurrent-safe increments of facet value counts."""
+
+    def add(self, dialect, rowcount, insert_error=None):
+        """Add a count and return executed statements."""
+        from invenio_collections import facets
+
+        with patch.object(facets, 'db') as db:
+            db.and_ = and_
+            db.engine.dialect.name = dialect
+            db.session.execute.return_value.rowcount = rowcount
+            if insert_error is not None:
+                db.session.begin_nested.return_value.__exit__.side_effect = \
+                    insert_error
+            facets._add_count(facets.CollectionFacetCount.__table__, 1,
+                              'year', '2015', 1)
+        return db.session.execute.call_args_list
+
+    def test_mysql(self):
+        """Increment with a single upsert statement."""
+        from invenio_collections.facets import _UPSERT_MYSQL
+
+        calls = self.add('mysql', 0)
+        self.assertEqual(len(calls), 1)
+        self.assertIs(calls[0][0][0], _UPSERT_MYSQL)
+
+    def test_existing_row(self):
+        """Update existing row only."""
+        self.assertEqual(len(self.add('sqlite', 1)), 1)
+
+    def test_missing_row(self):
+        """Insert missing row after the update."""
+        self.assertEqual(len(self.add('sqlite', 0)), 2)
+
+    def test_concurrent_insert(self):
+        """Update again when another writer inserted the row first."""
+        from sqlalchemy.exc import IntegrityError
+
+        calls = self.add('sqlite', 0, IntegrityError('', {}, None))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(str(calls[0][0][0]), str(calls[2][0][0]))
+
+
+TEST_SUITE = make_test_suite(ReplaceLayoutTest, UpdateFacetCountsTest,
+                             AddCountTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test lists of latest additions of collections."""
+
+import threading
+import time
+
+from intbitset import intbitset
+from mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class DictCache(object):
+
+    """Shared cache stand-in with atomic ``add`` and slow ``get``."""
+
+    cache = None
+
+    def __init__(self):
+        """Initialize empty cache."""
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return value, giving other threads a chance to interleave."""
+        value = self.data.get(key)
+        time.sleep(0.001)
+        return value
+
+    def set(self, key, value, timeout=None):
+        """Store value."""
+        self.data[key] = value
+
+    def add(self, key, value, timeout=None):
+        """Store value unless the key exists."""
+        with self._lock:
+            if key in self.data:
+                return False
+            self.data[key] = value
+            return True
+
+    def delete(self, key):
+        """Remove key."""
+        self.data.pop(key, None)
+
+
+class FakeRedis(object):
+
+    """Redis client stand-in supporting the list commands used."""
+
+    def __init__(self):
+        """Initialize empty database."""
+        self.data = {}
+
+    def pipeline(self):
+        """Return pipeline running commands on execute."""
+        client = self
+
+        class Pipeline(object):
+            def __init__(self):
+                self.commands = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.commands.append((name, args))
+
+            def execute(self):
+                return [getattr(client, name)(*args)
+                        for name, args in self.commands]
+        return Pipeline()
+
+    def lpushx(self, key, value):
+        if key in self.data:
+            self.data[key].insert(0, str(value).encode('ascii'))
+
+    def ltrim(self, key, start, end):
+        if key in self.data:
+            self.data[key] = self.data[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return self.data.get(key, [])[start:end + 1]
+
+    def exists(self, key):
+        return key in self.data
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(
+            str(value).encode('ascii') for value in values)
+
+    def renamenx(self, key, new):
+        if new in self.data:
+            return False
+        self.data[new] = self.data.pop(key)
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class LatestAdditionsTest(InvenioTestCase):
+
+    """Test shared lists of newest records."""
+
+    def setUp(self):
+        """Use in-memory cache and small lists."""
+        from invenio_collections import latest
+
+        self.app.config['COLLECTIONS_LATEST_ADDITIONS_SIZE'] = 3
+        self.cache = DictCache()
+        self.patches = [
+            patch.object(latest, 'cache', self.cache),
+            patch.object(latest, 'get_collection_hitset',
+                         return_value=intbitset([1, 2, 5, 7])),
+        ]
+        for item in self.patches:
+            item.start()
+
+    def tearDown(self):
+        """Stop patches."""
+        for item in self.patches:
+            item.stop()
+
+    def test_seed(self):
+        """Seed missing list from the end of the hit set."""
+        from invenio_collections.latest import get_latest_additions
+
+        self.assertEqual(get_latest_additions('Books', 2), [7, 5])
+        self.assertEqual(get_latest_additions('Books', 5), [7, 5, 2])
+
+    def test_push(self):
+        """Prepend to existing lists and keep their size."""
+        from invenio_collections.latest import _push, get_latest_additions
+
+        get_latest_additions('Books', 3)
+        _push(8, ['Books', 'Articles'])
+        self.assertEqual(get_latest_additions('Books', 3), [8, 7, 5])
+        # Missing lists are left to readers.
+        self.assertNotIn('collections::latest::Articles', self.cache.data)
+
+    def test_concurrent_push(self):
+        """Keep records pushed concurrently by several threads."""
+        from invenio_collections.latest import _push, get_latest_additions
+
+        self.app.config['COLLECTIONS_LATEST_ADDITIONS_SIZE'] = 100
+        get_latest_additions('Books', 1)
+
+        def push(recid):
+            with self.app.app_context():
+                _push(recid, ['Books'])
+
+        threads = [threading.Thread(target=push, args=(recid, ))
+                   for recid in range(10, 30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(get_latest_additions('Books', 100)),
+                         [1, 2, 5, 7] + list(range(10, 30)))
+
+    def test_redis(self):
+        """Use native lists of a Redis cache backend."""
+        from invenio_collections.latest import _push, get_latest_additions
+
+        self.cache.cache = type('RedisCache', (object, ), dict(
+            _client=FakeRedis(), key_prefix='p:'))()
+        _push(8, ['Books'])
+        self.assertEqual(get_latest_additions('Books', 2), [7, 5])
+        _push(8, ['Books'])
+        self.assertEqual(get_latest_additions('Books', 5), [8, 7, 5])
+        self.assertEqual(list(self.cache.cache._client.data),
+                         ['p:collections::latest::Books'])
+
+
+class PendingAdditionsTest(InvenioTestCase):
+
+    """Test pushing latest additions only after commit."""
+
+    def setUp(self):
+        """Use a real session and record pushes."""
+        from invenio_collections import latest
+
+        self.session = sessionmaker(bind=create_engine('sqlite://'))()
+        self.pushed = []
+        self.patches = [
+            patch.object(latest, 'db'),
+            patch.object(latest, '_push', side_effect=lambda recid, names:
+                         self.pushed.append(recid)),
+        ]
+        db = self.patches[0].start()
+        db.session.return_value = self.session
+        self.patches[1].start()
+
+    def tearDown(self):
+        """Stop patches and close session."""
+        for item in self.patches:
+            item.stop()
+        self.session.close()
+
+    def add(self, recid, fail=False):
+        """Add record in a savepoint, optionally rolling it back."""
+        from invenio_collections.latest import add_latest_addition
+        try:
+            with self.session.begin_nested():
+                add_latest_addition(recid, ['Books'])
+                if fail:
+                    raise ValueError()
+        except ValueError:
+            pass
+
+    def test_push_after_commit(self):
+        """Push nothing before the outermost commit."""
+        self.add(1)
+        self.add(2)
+        self.assertEqual(self.pushed, [])
+        self.session.commit()
+        self.assertEqual(self.pushed, [1, 2])
+
+    def test_rolled_back_savepoint(self):
+        """Drop records of rolled back savepoints only."""
+        self.add(1)
+        self.add(2, fail=True)
+        self.add(3)
+        self.session.commit()
+        self.assertEqual(self.pushed, [1, 3])
+
+    def test_rollback(self):
+        """Drop all records of a rolled back transaction."""
+        self.add(1)
+        self.session.rollback()
+        self.session.commit()
+        self.assertEqual(self.pushed, [])
+
+
+TEST_SUITE = make_test_suite(LatestAdditionsTest, PendingAdditionsTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test that hot collection lookups use indexes."""
+
+import os
+import unittest
+
+from sqlalchemy import create_engine
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+# URI of a MySQL database with a collection tree to check, if any.
+MYSQL_URI = os.environ.get('COLLECTIONS_TEST_MYSQL_URI')
+
+
+class QueryPlansTest(InvenioTestCase):
+
+    """Test query plans of the benchmark lookups."""
+
+    def assertNoFullScan(self, results):
+        """Fail if any lookup scans a whole table."""
+        self.assertEqual(
+            [(result['query'], result['plan']) for result in results
+             if 'error' in result], [])
+
+    def test_sqlite(self):
+        """Use indexes on tables created from the models."""
+        from invenio.ext.sqlalchemy import db
+        from invenio_collections.models import Collection, \
+            CollectionCollection, Collectionname, CollectionPortalbox, \
+            FacetCollection
+        from tests.benchmarks.plans import QUERIES, check_plans
+
+        engine = create_engine('sqlite://')
+        db.metadata.create_all(bind=engine, tables=[
+            model.__table__ for model in (
+                Collection, CollectionCollection, Collectionname,
+                CollectionPortalbox, FacetCollection)])
+        results = check_plans(engine)
+        self.assertEqual([result['query'] for result in results],
+                         [name for name, dummy in QUERIES])
+        self.assertNoFullScan(results)
+
+    @unittest.skipUnless(MYSQL_URI, 'COLLECTIONS_TEST_MYSQL_URI is not set')
+    def test_mysql(self):
+        """Use indexes in the configured MySQL database."""
+        from tests.benchmarks.plans import check_plans
+        self.assertNoFullScan(check_plans(create_engine(MYSQL_URI)))
+
+
+TEST_SUITE = make_test_suite(QueryPlansTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test packing of the reverse record index."""
+
+from mock import patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class PackTest(InvenioTestCase):
+
+    """Test packed collection identifiers."""
+
+    def test_roundtrip(self):
+        """Unpack what was packed."""
+        from invenio_collections.reverse_index import pack, unpack
+        for ids in ([], [1], [1, 2, 300], [2 ** 32 - 1]):
+            self.assertEqual(unpack(pack(ids)), tuple(ids))
+
+    def test_format(self):
+        """Store little-endian unsigned 32-bit integers."""
+        from invenio_collections.reverse_index import pack
+        self.assertEqual(pack([1, 258]),
+                         b'\x01\x00\x00\x00\x02\x01\x00\x00')
+
+
+class RecordCollectionIdsTest(InvenioTestCase):
+
+    """Test reading and writing the reverse index."""
+
+    def test_update(self):
+        """Store packed identifiers of assigned collections."""
+        from invenio_collections import reverse_index
+
+        with patch.object(reverse_index, 'db') as db, \
+                patch.object(reverse_index, 'CollectionRecord') as model, \
+                patch.object(reverse_index, 'get_collection_ids',
+                             return_value=[3, 1]) as get_ids:
+            reverse_index.update_record_collection_ids({'title': 'x'})
+            self.assertFalse(db.session.merge.called)
+            reverse_index.update_record_collection_ids(
+                {'recid': 7, '_collections': ['A', 'B']})
+        get_ids.assert_called_once_with(['A', 'B'])
+        model.assert_called_once_with(
+            id_bibrec=7, id_collections=reverse_index.pack([3, 1]))
+        db.session.merge.assert_called_once_with(model.return_value)
+
+    def test_chunks(self):
+        """Query many records in bounded chunks."""
+        from invenio_collections import reverse_index
+
+        with patch.object(reverse_index, 'CHUNK_SIZE', 2), \
+                patch.object(reverse_index, 'CollectionRecord') as model:
+            query = model.query.filter.return_value
+            query.values.side_effect = [
+                [(1, reverse_index.pack([1])), (2, reverse_index.pack([]))],
+                [(5, reverse_index.pack([2, 4]))],
+            ]
+            self.assertEqual(
+                reverse_index.get_record_collection_ids([1, 2, 5]),
+                {1: (1, ), 2: (), 5: (2, 4)})
+        self.assertEqual(model.id_bibrec.in_.call_count, 2)
+        model.id_bibrec.in_.assert_called_with([5])
+
+
+TEST_SUITE = make_test_suite(PackTest, RecordCollectionIdsTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
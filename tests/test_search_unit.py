@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test collection search unit."""
+
+from intbitset import intbitset
+from mock import patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class CollectionSearchUnitTest(InvenioTestCase):
+
+    """Test fallback of collection queries to word search."""
+
+    def setUp(self):
+        """Forget missed terms."""
+        from invenio_collections.cache import collection_hitset_missing
+        collection_hitset_missing.clear()
+
+    def search(self, words, *args):
+        """Search unknown collection falling back to given words."""
+        from invenio_collections.searchext.units.collection import \
+            search_unit
+
+        def bibwords(query, f, m, wl=None):
+            self.calls.append((query, m, wl))
+            return intbitset(words.get(m, []))
+
+        with patch('invenio.legacy.search_engine.search_unit_in_bibwords',
+                   side_effect=bibwords), \
+                patch('invenio_collections.cache.get_collection_hitset',
+                      return_value=intbitset()), \
+                patch('invenio_collections.cache.collection_hitset_cache') \
+                as collection_hitset_cache:
+            collection_hitset_cache.cache = {}
+            return search_unit('BOOK', 'collection', *args)
+
+    def test_remember_miss(self):
+        """Skip word search of a term that matched nothing."""
+        self.calls = []
+        self.assertEqual(self.search({}, 'e'), intbitset())
+        self.assertEqual(self.search({}, 'e'), intbitset())
+        self.assertEqual(self.calls, [('BOOK', 'e', None)])
+
+    def test_miss_per_match_type(self):
+        """Keep searching words with other match types and limits."""
+        self.calls = []
+        self.assertEqual(self.search({'r': [5]}, 'e'), intbitset())
+        self.assertEqual(self.search({'r': [5]}, 'r'), intbitset([5]))
+        self.assertEqual(self.search({'r': [5]}, 'e', 10), intbitset())
+        self.assertEqual(self.calls, [('BOOK', 'e', None),
+                                      ('BOOK', 'r', None),
+                                      ('BOOK', 'e', 10)])
+
+
+TEST_SUITE = make_test_suite(CollectionSearchUnitTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test on-disk snapshot of the collection tree."""
+
+import os
+import shutil
+import tempfile
+
+from intbitset import intbitset
+from mock import Mock
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class SnapshotTest(InvenioTestCase):
+
+    """Test writing and mapping of snapshot files."""
+
+    def setUp(self):
+        """Create temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'snapshot')
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        """Read back what was written."""
+        from invenio_collections.snapshot import Snapshot, write_snapshot
+        write_snapshot(
+            self.path, '2015-09-18 10:00:00',
+            {1: u'Root', 2: u'Articles', 3: u'B\xfccher'},
+            [(1, 2), (1, 3)],
+            {1: intbitset([1, 2, 3])},
+            {2: intbitset([10, 11]), 3: intbitset([12])})
+        snapshot = Snapshot(self.path)
+        try:
+            self.assertEqual(snapshot.timestamp, '2015-09-18 10:00:00')
+            self.assertEqual(snapshot.size, 3)
+            self.assertEqual(list(snapshot.edges()), [(1, 2), (1, 3)])
+            self.assertEqual(snapshot.descendants[1], intbitset([1, 2, 3]))
+            self.assertEqual(snapshot.descendants[2], intbitset([2]))
+            self.assertEqual(sorted(snapshot.descendant_names[u'Root']),
+                             [u'Articles', u'B\xfccher', u'Root'])
+            self.assertEqual(snapshot.reclists[u'B\xfccher'],
+                             intbitset([12]))
+            self.assertEqual(snapshot.reclists[u'Root'], intbitset())
+            self.assertNotIn(u'Missing', snapshot.reclists)
+            self.assertEqual(len(snapshot.reclists), 3)
+        finally:
+            snapshot.close()
+
+    def test_replace(self):
+        """Replace snapshot atomically without leaving temporary files."""
+        from invenio_collections.snapshot import Snapshot, write_snapshot
+        write_snapshot(self.path, '2015-09-18 10:00:00', {1: u'Root'}, [],
+                       {}, {})
+        old = Snapshot(self.path)
+        write_snapshot(self.path, '2015-09-18 11:00:00',
+                       {1: u'Root', 2: u'Books'}, [(1, 2)], {}, {})
+        new = Snapshot(self.path)
+        try:
+            self.assertEqual(old.timestamp, '2015-09-18 10:00:00')
+            self.assertEqual(old.size, 1)
+            self.assertEqual(new.timestamp, '2015-09-18 11:00:00')
+            self.assertEqual(new.size, 2)
+            self.assertEqual(os.listdir(self.directory), ['snapshot'])
+        finally:
+            old.close()
+            new.close()
+
+    def test_invalid_file(self):
+        """Refuse files that are not snapshots."""
+        from invenio_collections.snapshot import HEADER, Snapshot
+        with open(self.path, 'wb') as fp:
+            fp.write(b'\x00' * HEADER.size)
+        self.assertRaises(ValueError, Snapshot, self.path)
+
+
+class IsCurrentTest(InvenioTestCase):
+
+    """Test freshness of snapshots."""
+
+    def is_current(self, snapshot_timestamp, timestamp):
+        """Compare snapshot time with table update time."""
+        from invenio_collections.snapshot import is_current
+        return is_current(Mock(timestamp=snapshot_timestamp), timestamp)
+
+    def test_timestamps(self):
+        """Use snapshot not older than the tables."""
+        self.assertTrue(self.is_current('2015-09-18 10:00:00',
+                                        '2015-09-18 10:00:00'))
+        self.assertTrue(self.is_current('2015-09-18 10:00:00',
+                                        '2015-09-18 09:59:59'))
+        self.assertFalse(self.is_current('2015-09-18 10:00:00',
+                                         '2015-09-18 10:00:01'))
+
+    def test_unknown_update_time(self):
+        """Treat missing update times as stale."""
+        self.assertFalse(self.is_current('None', None))
+        self.assertFalse(self.is_current('2015-09-18 10:00:00', None))
+        self.assertFalse(self.is_current('None', '2015-09-18 10:00:00'))
+
+
+TEST_SUITE = make_test_suite(SnapshotTest, IsCurrentTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
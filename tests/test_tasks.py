@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test collection background tasks."""
+
+from intbitset import intbitset
+from mock import Mock, patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class ReclassifyCollectionTest(InvenioTestCase):
+
+    """Test reclassification after a change of collection query."""
+
+    def test_reclassify(self):
+        """Update only affected records and their virtual ancestors."""
+        from invenio_collections import tasks
+
+        records = {
+            1: {'recid': 1, '_collections': []},
+            2: {'recid': 2, '_collections': ['Books', 'Library']},
+            3: {'recid': 3, '_collections': ['Books', 'Ebooks', 'Library']},
+        }
+        hits = {'980:"OLD"': intbitset([2, 3]),
+                '980:"NEW"': intbitset([1])}
+        queries = {'Books': dict(ancestors=set(['Library'])),
+                   'Ebooks': dict(ancestors=set(['Library']))}
+        collection = Mock(ancestors=[Mock(dbquery=None), Mock(dbquery='x')])
+        collection.name = 'Books'
+        collection.ancestors[0].name = 'Library'
+        collection.ancestors[1].name = 'Regular'
+
+        stored = {}
+        reclists = {}
+        with patch('invenio_collections.models.Collection') as Collection, \
+                patch('invenio_records.api.get_record',
+                      side_effect=lambda recid: dict(records[recid])), \
+                patch('invenio_collections.recordext.functions.'
+                      'get_record_collections.get_queries',
+                      return_value=queries), \
+                patch('invenio_collections.cache.get_collection_allchildren',
+                      return_value=['Library', 'Books', 'Ebooks']), \
+                patch('invenio.legacy.search_engine.get_collection_reclist',
+                      side_effect=lambda name: intbitset(
+                          [3] if name in ('Ebooks', 'Library') else []),
+                      create=True), \
+                patch.object(tasks, '_search',
+                             side_effect=lambda dbquery: hits[dbquery]), \
+                patch.object(tasks, '_store_collections',
+                             side_effect=lambda record, names: stored.update(
+                                 {record['recid']: sorted(names)})), \
+                patch.object(tasks, '_set_reclist',
+                             side_effect=reclists.__setitem__), \
+                patch.object(tasks.reclassify_collection, 'update_state'):
+            Collection.query.get.return_value = collection
+            result = tasks.reclassify_collection(5, '980:"OLD"', '980:"NEW"')
+
+        self.assertEqual(stored, {1: ['Books', 'Library'],
+                                  2: [],
+                                  3: ['Ebooks', 'Library']})
+        self.assertEqual(reclists, {'Books': intbitset([1]),
+                                    'Library': intbitset([1, 3])})
+        self.assertEqual(result, dict(current=3, total=3, added=1,
+                                      removed=2))
+
+
+class RecountCollectionFacetsTest(InvenioTestCase):
+
+    """Test recount of facet values after a layout change."""
+
+    def test_recount_descendants(self):
+        """Recount the collection and its descendants."""
+        from invenio_collections import tasks
+
+        collection = Mock()
+        collection.name = 'Library'
+        with patch('invenio_collections.models.Collection') as Collection, \
+                patch('invenio_collections.cache.get_collection_allchildren',
+                      return_value=['Library', 'Books']) as allchildren, \
+                patch('invenio_collections.facets.rebuild_facet_counts') \
+                as rebuild_facet_counts:
+            Collection.query.get.return_value = collection
+            tasks.recount_collection_facets(5)
+            Collection.query.get.return_value = None
+            tasks.recount_collection_facets(6)
+        allchildren.assert_called_once_with('Library')
+        rebuild_facet_counts.assert_called_once_with(
+            names=['Library', 'Books'])
+
+
+TEST_SUITE = make_test_suite(ReclassifyCollectionTest,
+                             RecountCollectionFacetsTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2015 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test collection views."""
+
+import json
+
+from intbitset import intbitset
+from mock import patch
+
+from invenio.testsuite import InvenioTestCase, make_test_suite, \
+    run_test_suite
+
+
+class AutocompleteTest(InvenioTestCase):
+
+    """Test completion of collection names."""
+
+    def complete(self, q, accessible):
+        """Return completed names with given accessible collection ids."""
+        from invenio_collections.cache import CollectionNameIndex
+        index = CollectionNameIndex([
+            ('Articles', 'Articles'), ('Archive', 'Archive'),
+            ('Arxiv', 'Arxiv'),
+        ])
+        module = 'invenio_collections.views.collections.'
+        with patch(module + 'get_accessible_collection_ids',
+                   return_value=intbitset(accessible)), \
+                patch(module + 'collection_id_cache') as collection_id_cache, \
+                patch(module + 'get_collection_name_index',
+                      return_value=index), \
+                patch(module + 'get_coll_i18nname',
+                      side_effect=lambda name, *args, **kwargs: name):
+            collection_id_cache.cache = {'Articles': 1, 'Archive': 2,
+                                         'Arxiv': 3}
+            response = self.client.get(
+                '/collection/autocomplete?q={0}&limit=2'.format(q))
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in
+                json.loads(response.get_data(as_text=True))['results']]
+
+    def test_hide_restricted(self):
+        """Leave out collections the user cannot see."""
+        self.assertEqual(self.complete('ar', [1, 3]), ['Articles', 'Arxiv'])
+        self.assertEqual(self.complete('ar', [2]), ['Archive'])
+        self.assertEqual(self.complete('ar', []), [])
+
+    def test_empty_query(self):
+        """Complete nothing without a prefix."""
+        self.assertEqual(self.complete('', [1, 2, 3]), [])
+
+
+TEST_SUITE = make_test_suite(AutocompleteTest)
+
+if __name__ == '__main__':
+    run_test_suite(TEST_SUITE)